@@ -0,0 +1,315 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tarfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app import schemas
+from app.database import engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = "backups"
+UPLOADS_DIR = os.path.join("static", "uploads")
+
+# Pages copied per backup step, and the pause between steps during which
+# writers can take the database lock
+PAGES_PER_STEP = 1024
+STEP_PAUSE = 0.005
+
+# A commit by another connection makes SQLite restart a stepped backup, so
+# under steady writes it might never finish; after this many restarts the
+# rest is copied in one step, briefly holding off writers instead
+MAX_RESTARTS = 3
+
+_process_lock = threading.Lock()
+
+
+def _path(*parts: str) -> str:
+    return os.path.join(BACKUP_DIR, *parts)
+
+
+@contextmanager
+def _backup_lock():
+    """Serialize backups within and across worker processes."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    with _process_lock:
+        with open(_path(".lock"), "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_database(target_path: str) -> int:
+    """Copy the live database to target_path with SQLite's online backup API.
+    
+    The copy is made PAGES_PER_STEP pages at a time, and the source is only
+    locked while a step runs, so writers are never blocked for long. The
+    result is a consistent snapshot of the database.
+    
+    Returns:
+        Size of the copy in bytes
+    """
+    source = sqlite3.connect(engine.url.database)
+    target = sqlite3.connect(target_path)
+    restarts = 0
+    previous_remaining = None
+    
+    def progress(status, remaining, total):
+        nonlocal restarts, previous_remaining
+        # Remaining only goes back up when the backup restarted
+        if previous_remaining is not None and remaining >= previous_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        previous_remaining = remaining
+        time.sleep(STEP_PAUSE)
+    
+    try:
+        try:
+            source.backup(target, pages=PAGES_PER_STEP, progress=progress)
+        except _TooManyRestarts:
+            source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return os.path.getsize(target_path)
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _object_path(file_hash: str) -> str:
+    return _path("objects", file_hash[:2], file_hash)
+
+
+def sync_uploads() -> Dict[str, object]:
+    """Copy new or changed upload files into the content-addressed object store.
+    
+    Files are only re-hashed when their size or mtime changed since the last
+    backup, and only contents not already stored are copied.
+    
+    Returns:
+        Dict with "files" (upload name -> content hash), "copied" and
+        "bytes_copied"
+    """
+    cache_path = _path("upload_hashes.json")
+    try:
+        with open(cache_path, "r") as f:
+            hash_cache = json.load(f)
+    except FileNotFoundError:
+        hash_cache = {}
+    
+    files = {}
+    new_cache = {}
+    copied = 0
+    bytes_copied = 0
+    if os.path.isdir(UPLOADS_DIR):
+        with os.scandir(UPLOADS_DIR) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                cached = hash_cache.get(entry.name)
+                if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                    file_hash = cached[2]
+                else:
+                    file_hash = _file_hash(entry.path)
+                new_cache[entry.name] = [stat.st_size, stat.st_mtime_ns, file_hash]
+                files[entry.name] = file_hash
+                
+                object_path = _object_path(file_hash)
+                if not os.path.exists(object_path):
+                    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                    temp_path = object_path + ".tmp"
+                    shutil.copyfile(entry.path, temp_path)
+                    os.replace(temp_path, object_path)
+                    copied += 1
+                    bytes_copied += stat.st_size
+    
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(new_cache, f)
+    os.replace(temp_path, cache_path)
+    return {"files": files, "copied": copied, "bytes_copied": bytes_copied}
+
+
+def create_snapshot() -> schemas.BackupResponse:
+    """Create a snapshot archive of the database and the upload manifest.
+    
+    The archive (backups/notecraft-<timestamp>.tar) holds a consistent copy
+    of notes.db and a manifest mapping each upload to its content hash;
+    upload contents live in backups/objects, shared between snapshots.
+    """
+    with _backup_lock():
+        start = time.perf_counter()
+        created_at = datetime.utcnow()
+        name = f"notecraft-{created_at.strftime('%Y%m%d-%H%M%S-%f')}"
+        
+        database_copy = _path(f"{name}.db.tmp")
+        try:
+            database_bytes = backup_database(database_copy)
+            uploads = sync_uploads()
+            manifest = json.dumps({
+                "created_at": created_at.isoformat(),
+                "uploads": uploads["files"],
+            }, indent=2).encode("utf-8")
+            
+            archive_path = _path(f"{name}.tar")
+            temp_path = archive_path + ".tmp"
+            with tarfile.open(temp_path, "w") as archive:
+                archive.add(database_copy, arcname="notes.db")
+                info = tarfile.TarInfo("manifest.json")
+                info.size = len(manifest)
+                info.mtime = int(created_at.timestamp())
+                archive.addfile(info, io.BytesIO(manifest))
+            os.replace(temp_path, archive_path)
+        finally:
+            if os.path.exists(database_copy):
+                os.remove(database_copy)
+        
+        duration = time.perf_counter() - start
+        bytes_written = database_bytes + uploads["bytes_copied"]
+        return schemas.BackupResponse(
+            archive=archive_path,
+            created_at=created_at,
+            duration_seconds=duration,
+            database_bytes=database_bytes,
+            uploads_total=len(uploads["files"]),
+            uploads_copied=uploads["copied"],
+            uploads_bytes_copied=uploads["bytes_copied"],
+            throughput_mb_per_second=bytes_written / duration / 1e6 if duration else 0.0
+        )
+
+
+def list_snapshots() -> List[str]:
+    """Return snapshot archive names, oldest first."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(BACKUP_DIR)
+        if name.startswith("notecraft-") and name.endswith(".tar")
+    )
+
+
+def prune_snapshots(keep: int) -> int:
+    """Delete all but the newest keep archives and objects no longer referenced.
+    
+    Returns:
+        Number of archives deleted
+    """
+    with _backup_lock():
+        snapshots = list_snapshots()
+        expired = snapshots[:-keep] if keep > 0 else snapshots
+        for name in expired:
+            os.remove(_path(name))
+        
+        referenced = set()
+        for name in snapshots[len(expired):]:
+            with tarfile.open(_path(name), "r") as archive:
+                manifest = json.load(archive.extractfile("manifest.json"))
+            referenced.update(manifest["uploads"].values())
+        # Objects of the current uploads are kept for the next backup
+        try:
+            with open(_path("upload_hashes.json"), "r") as f:
+                referenced.update(cached[2] for cached in json.load(f).values())
+        except FileNotFoundError:
+            pass
+        
+        objects_dir = _path("objects")
+        if os.path.isdir(objects_dir):
+            for prefix in os.listdir(objects_dir):
+                for file_hash in os.listdir(os.path.join(objects_dir, prefix)):
+                    if file_hash not in referenced:
+                        os.remove(os.path.join(objects_dir, prefix, file_hash))
+        return len(expired)
+
+
+class BackupScheduler:
+    """
+    Background thread that creates a snapshot every interval seconds and
+    keeps the newest keep archives.
+    
+    Every worker process may start one; only the worker holding the
+    scheduler lock (backups/.scheduler.lock) takes scheduled snapshots,
+    and another takes over if that worker exits.
+    """
+    
+    def __init__(self, interval: float, keep: int = 7):
+        self.interval = interval
+        self.keep = keep
+        self.last_result: Optional[schemas.BackupResponse] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock_file = None
+    
+    def start(self):
+        """Start the background backup thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="notecraft-backup", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the backup thread (an in-progress backup finishes first)."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        if self._lock_file is not None:
+            # Closing releases the lock for a scheduler in another worker
+            self._lock_file.close()
+            self._lock_file = None
+    
+    def _is_elected(self) -> bool:
+        """Try (without blocking) to become the one scheduling process."""
+        if self._lock_file is not None or not fcntl:
+            return True
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        lock_file = open(_path(".scheduler.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if not self._is_elected():
+                    continue
+                self.last_result = create_snapshot()
+                prune_snapshots(self.keep)
+                logger.info(
+                    "Backup %s: %.2fs, %.1f MB/s",
+                    self.last_result.archive,
+                    self.last_result.duration_seconds,
+                    self.last_result.throughput_mb_per_second
+                )
+            except Exception:
+                logger.exception("Scheduled backup failed")
@@ -1,9 +1,15 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func, extract
+from sqlalchemy import or_, and_, func, extract, update, case, select, delete, insert, text, bindparam, DateTime
 from datetime import datetime, timedelta
+import json
 from typing import List, Optional, Dict
-from app import models, schemas
-from app.utils import extract_plaintext, html_to_markdown
+from app import models, schemas, search_index, related_index, upload_gc
+from app.utils import extract_plaintext, html_to_markdown, content_hash, apply_text_edits
+from app.search_cache import search_cache, cache_key
+
+
+class VersionConflictError(ValueError):
+    """Raised when a delta update's base version no longer matches the note."""
 
 
 def generate_note_title() -> str:
@@ -13,6 +19,38 @@ def generate_note_title() -> str:
 
 # Note CRUD Operations
 
+def _bump_write_generation(db: Session) -> None:
+    """Invalidate cached search results in every worker (caller commits)."""
+    db.execute(
+        update(models.WriteGeneration).values(value=models.WriteGeneration.value + 1)
+    )
+
+
+def get_write_generation(db: Session) -> int:
+    """Get the current note write generation."""
+    return db.execute(select(models.WriteGeneration.value)).scalar() or 0
+
+
+def _set_note_tags(db: Session, note_id: int, tags: List[str]) -> None:
+    """Replace a note's rows in the note_tags association table."""
+    db.execute(delete(models.NoteTag).where(models.NoteTag.note_id == note_id))
+    if tags:
+        db.execute(
+            insert(models.NoteTag),
+            [{"note_id": note_id, "tag": tag} for tag in dict.fromkeys(tags)]
+        )
+
+
+def _has_tag(tag: str):
+    """Filter for notes carrying exactly this tag, via the note_tags index.
+    
+    Unlike a LIKE over the JSON tags text, "AI" does not match "Email".
+    """
+    return models.Note.id.in_(
+        select(models.NoteTag.note_id).where(models.NoteTag.tag == tag)
+    )
+
+
 def create_note(db: Session, note: schemas.NoteCreate) -> models.Note:
     """Create a new note with auto-generated title."""
     # Generate auto-title
@@ -29,12 +67,19 @@ def create_note(db: Session, note: schemas.NoteCreate) -> models.Note:
         plaintext=plaintext,
         markdown_content=markdown_content,
         area=note.area,
-        tags=note.tags
+        tags=note.tags,
+        content_hash=content_hash(note.html_content)
     )
     
     db.add(db_note)
+    db.flush()
+    search_index.index_note(db, db_note.id, db_note.title, plaintext)
+    _set_note_tags(db, db_note.id, note.tags)
+    upload_gc.set_note_images(db, db_note.id, note.html_content)
+    _bump_write_generation(db)
     db.commit()
     db.refresh(db_note)
+    related_index.update_notes({db_note.id: plaintext})
     return db_note
 
 
@@ -55,7 +100,7 @@ def get_notes(
     # Apply tag filters with AND logic
     if tags:
         for tag in tags:
-            query = query.filter(models.Note.tags.contains(tag))
+            query = query.filter(_has_tag(tag))
     
     # Order by modified_at DESC and apply pagination
     query = query.order_by(models.Note.modified_at.desc())
@@ -79,7 +124,7 @@ def count_notes(
     # Apply tag filters with AND logic
     if tags:
         for tag in tags:
-            query = query.filter(models.Note.tags.contains(tag))
+            query = query.filter(_has_tag(tag))
     
     return query.scalar()
 
@@ -89,12 +134,89 @@ def get_note(db: Session, note_id: int) -> Optional[models.Note]:
     return db.query(models.Note).filter(models.Note.id == note_id).first()
 
 
+def _derive_note_fields(changes: dict) -> None:
+    """Fill in derived columns for a set of note changes, in place.
+    
+    Plaintext and markdown already present in changes are kept.
+    """
+    # Regenerate derived content only when the HTML actually changed
+    if "html_content" in changes:
+        html_content = changes["html_content"]
+        if "plaintext" not in changes:
+            changes["plaintext"] = extract_plaintext(html_content)
+            changes["markdown_content"] = html_to_markdown(html_content)
+        changes["content_hash"] = content_hash(html_content)
+    changes["modified_at"] = datetime.utcnow()
+
+
+def _write_note_changes(
+    db: Session,
+    db_note: models.Note,
+    changes: dict,
+    base_hash: Optional[str] = None
+) -> Optional[models.Note]:
+    """Persist changes with a single UPDATE ... RETURNING.
+    
+    If base_hash is given the UPDATE only applies while the stored content
+    hash still matches it; None is returned when it does not.
+    """
+    _derive_note_fields(changes)
+    
+    stmt = update(models.Note).where(models.Note.id == db_note.id)
+    if base_hash is not None:
+        stmt = stmt.where(models.Note.content_hash == base_hash)
+    updated_note = db.execute(
+        stmt.values(**changes).returning(models.Note)
+    ).scalar_one_or_none()
+    if updated_note is None:
+        db.rollback()
+        return None
+    
+    if "plaintext" in changes:
+        search_index.index_note(db, updated_note.id, updated_note.title, changes["plaintext"])
+    if "html_content" in changes:
+        upload_gc.set_note_images(db, updated_note.id, changes["html_content"])
+    if "tags" in changes:
+        _set_note_tags(db, updated_note.id, changes["tags"])
+    _bump_write_generation(db)
+    
+    # RETURNING already refreshed the object; detach it so the commit does
+    # not expire it and trigger another SELECT
+    db.expunge(updated_note)
+    db.commit()
+    if "plaintext" in changes:
+        related_index.update_notes({updated_note.id: changes["plaintext"]})
+    return updated_note
+
+
+def _note_changes(
+    db_note: models.Note,
+    html_content: Optional[str],
+    area: Optional[str],
+    tags: Optional[List[str]],
+    area_set: bool
+) -> dict:
+    """Return only the fields whose submitted value differs from the stored one."""
+    changes = {}
+    if html_content is not None and content_hash(html_content) != db_note.content_hash:
+        changes["html_content"] = html_content
+    if area_set and area != db_note.area:
+        changes["area"] = area
+    if tags is not None and tags != db_note.tags:
+        changes["tags"] = tags
+    return changes
+
+
 def update_note(
     db: Session,
     note_id: int,
     note_update: schemas.NoteUpdate
 ) -> Optional[models.Note]:
-    """Update an existing note."""
+    """Update an existing note.
+    
+    Submissions identical to the stored note (repeated saves, autosave)
+    skip content conversion and the write entirely.
+    """
     db_note = get_note(db, note_id)
     if not db_note:
         return None
@@ -102,25 +224,118 @@ def update_note(
     # Get update data
     update_data = note_update.model_dump(exclude_unset=True)
     
-    # If html_content changed, regenerate plaintext and markdown
-    if "html_content" in update_data:
-        update_data["plaintext"] = extract_plaintext(update_data["html_content"])
-        update_data["markdown_content"] = html_to_markdown(update_data["html_content"])
-    
     # Ensure tags is never set to None (coerce to empty list)
     if "tags" in update_data and update_data["tags"] is None:
         update_data["tags"] = []
     
-    # Update fields
-    for field, value in update_data.items():
-        setattr(db_note, field, value)
+    changes = _note_changes(
+        db_note,
+        update_data.get("html_content"),
+        update_data.get("area"),
+        update_data.get("tags"),
+        area_set="area" in update_data
+    )
+    if not changes:
+        return db_note
     
-    # Update modified_at timestamp
-    db_note.modified_at = datetime.utcnow()
+    return _write_note_changes(db, db_note, changes)
+
+
+def patch_note(
+    db: Session,
+    note_id: int,
+    note_patch: schemas.NotePatch
+) -> Optional[models.Note]:
+    """Apply text edits to a note's HTML content with optimistic concurrency.
     
+    Raises VersionConflictError if note_patch.base_hash does not match the
+    stored content, and ValueError if the edits do not fit the base.
+    """
+    db_note = get_note(db, note_id)
+    if not db_note:
+        return None
+    
+    if db_note.content_hash != note_patch.base_hash:
+        raise VersionConflictError("Note was modified since the base version")
+    
+    html_content = None
+    if note_patch.edits:
+        html_content = apply_text_edits(
+            db_note.html_content,
+            [(edit.start, edit.end, edit.text) for edit in note_patch.edits]
+        )
+    
+    changes = _note_changes(
+        db_note,
+        html_content,
+        note_patch.area,
+        note_patch.tags,
+        area_set="area" in note_patch.model_fields_set
+    )
+    if not changes:
+        return db_note
+    
+    # The UPDATE is conditional on the base hash so a concurrent writer
+    # between our read and this statement is detected, not overwritten
+    updated_note = _write_note_changes(db, db_note, changes, base_hash=note_patch.base_hash)
+    if updated_note is None:
+        raise VersionConflictError("Note was modified since the base version")
+    return updated_note
+
+
+def apply_note_updates(db: Session, updates: Dict[int, dict]) -> int:
+    """Apply pending field updates to many notes in one transaction.
+    
+    Args:
+        updates: Mapping of note id to the fields to set (html_content,
+            area and/or tags); plaintext and markdown_content may come
+            along with html_content when the caller already derived them
+    
+    Returns:
+        Number of notes actually written
+    """
+    if not updates:
+        return 0
+    
+    notes = db.query(models.Note).filter(models.Note.id.in_(list(updates))).all()
+    written = 0
+    reindexed = {}
+    for db_note in notes:
+        fields = updates[db_note.id]
+        changes = _note_changes(
+            db_note,
+            fields.get("html_content"),
+            fields.get("area"),
+            fields.get("tags"),
+            area_set="area" in fields
+        )
+        if not changes:
+            continue
+        if "html_content" in changes and "plaintext" in fields:
+            changes["plaintext"] = fields["plaintext"]
+            changes["markdown_content"] = fields["markdown_content"]
+        _derive_note_fields(changes)
+        result = db.execute(
+            update(models.Note).where(models.Note.id == db_note.id).values(**changes)
+        )
+        if not result.rowcount:
+            # Deleted after it was read above; its index and association
+            # rows must not be recreated
+            continue
+        if "plaintext" in changes:
+            search_index.index_note(db, db_note.id, db_note.title, changes["plaintext"])
+            reindexed[db_note.id] = changes["plaintext"]
+        if "html_content" in changes:
+            upload_gc.set_note_images(db, db_note.id, changes["html_content"])
+        if "tags" in changes:
+            _set_note_tags(db, db_note.id, changes["tags"])
+        written += 1
+    
+    if written:
+        _bump_write_generation(db)
     db.commit()
-    db.refresh(db_note)
-    return db_note
+    related_index.update_notes(reindexed)
+    return written
 
 
 def delete_note(db: Session, note_id: int) -> bool:
@@ -129,22 +344,216 @@ def delete_note(db: Session, note_id: int) -> bool:
     if not db_note:
         return False
     
+    search_index.remove_note(db, note_id)
+    upload_gc.remove_notes(db, [note_id])
+    _set_note_tags(db, note_id, [])
     db.delete(db_note)
+    _bump_write_generation(db)
     db.commit()
+    related_index.update_notes({note_id: None})
     return True
 
 
+def get_related_notes(
+    db: Session,
+    note_id: int,
+    limit: int = 10
+) -> Optional[List[schemas.RelatedNote]]:
+    """Get the notes most similar to a note by TF-IDF cosine similarity."""
+    db_note = get_note(db, note_id)
+    if not db_note:
+        return None
+    
+    matches = related_index.related_notes(db_note.id, db_note.plaintext, limit)
+    if not matches:
+        return []
+    
+    # Fetch metadata for all matches in one query, then keep score order
+    rows = db.query(
+        models.Note.id, models.Note.title, models.Note.area, models.Note.tags
+    ).filter(models.Note.id.in_([match_id for match_id, _ in matches])).all()
+    notes_by_id = {row.id: row for row in rows}
+    
+    return [
+        schemas.RelatedNote(
+            id=match_id,
+            title=notes_by_id[match_id].title,
+            area=notes_by_id[match_id].area,
+            tags=notes_by_id[match_id].tags,
+            score=score
+        )
+        for match_id, score in matches
+        if match_id in notes_by_id
+    ]
+
+
 # Search Operations
 
+# Maximum number of ranked results returned by fuzzy search
+FUZZY_RESULT_LIMIT = 100
+
+# Snippet window length and how much of it precedes the first match
+SNIPPET_LENGTH = 150
+SNIPPET_CONTEXT = 60
+
+
+def _sql_html_escape(expr):
+    """SQL expression HTML-escaping a text expression."""
+    return func.replace(func.replace(func.replace(expr, "&", "&amp;"), "<", "&lt;"), ">", "&gt;")
+
+
+def _snippet_expression(keyword: str):
+    """SQL expression for a search snippet, computed inside SQLite.
+    
+    The snippet is HTML: the plaintext window is escaped and the first match
+    of keyword is wrapped in <mark>. Notes without a content match (title
+    matches, fuzzy matches) get the start of their plaintext.
+    """
+    plaintext = func.coalesce(models.Note.plaintext, "")
+    length = func.length(plaintext)
+    head = _sql_html_escape(func.substr(plaintext, 1, SNIPPET_LENGTH)) + case(
+        (length > SNIPPET_LENGTH, "..."), else_=""
+    )
+    if not keyword:
+        return head
+    
+    keyword_length = len(keyword)
+    # SQLite's lower() matches LIKE's ASCII-only case folding
+    position = func.instr(func.lower(plaintext), func.lower(keyword))
+    start = func.max(1, position - SNIPPET_CONTEXT)
+    after_length = func.max(0, SNIPPET_LENGTH - (position - start) - keyword_length)
+    end = position + keyword_length + after_length
+    centred = (
+        case((start > 1, "..."), else_="")
+        + _sql_html_escape(func.substr(plaintext, start, position - start))
+        + "<mark>"
+        + _sql_html_escape(func.substr(plaintext, position, keyword_length))
+        + "</mark>"
+        + _sql_html_escape(func.substr(plaintext, position + keyword_length, after_length))
+        + case((end <= length, "..."), else_="")
+    )
+    return case((position > 0, centred), else_=head)
+
+
+def _facet_columns(matches):
+    """Scalar subqueries with per-area and per-tag counts as JSON objects.
+    
+    They do not depend on the outer row, so SQLite evaluates each once and
+    the counts come back with the result rows in a single statement. Tag
+    counts use the note_tags primary key for each matching note.
+    """
+    area_counts = (
+        select(matches.c.area.label("name"), func.count().label("count"))
+        .group_by(matches.c.area)
+        .subquery()
+    )
+    tag_counts = (
+        select(models.NoteTag.tag.label("name"), func.count().label("count"))
+        .where(models.NoteTag.note_id.in_(select(matches.c.id)))
+        .group_by(models.NoteTag.tag)
+        .subquery()
+    )
+    return (
+        select(func.json_group_object(
+            func.coalesce(area_counts.c.name, "None"), area_counts.c.count
+        )).scalar_subquery().label("area_facets"),
+        select(func.json_group_object(
+            tag_counts.c.name, tag_counts.c.count
+        )).scalar_subquery().label("tag_facets"),
+    )
+
+
 def search_notes(
     db: Session,
     search_request: schemas.SearchRequest
+) -> schemas.SearchResponse:
+    """Search notes with keyword and filters.
+    
+    Result ids are cached per worker, keyed by the normalized request and
+    the write generation, so repeated searches skip the table scan.
+    """
+    key = cache_key(search_request)
+    generation = get_write_generation(db)
+    cached = search_cache.get(key, generation)
+    if cached is not None:
+        ids, facets = cached
+        results = _search_results_by_ids(db, ids, search_request)
+        return schemas.SearchResponse(results=results, total=len(results), facets=facets)
+    
+    response = _run_search(db, search_request)
+    search_cache.put(key, generation, [result.id for result in response.results], response.facets)
+    return response
+
+
+def _json_values(values: List):
+    """Select the values of a list passed as one JSON parameter.
+    
+    Keeps large id lists clear of SQLite's bound-variable limit.
+    """
+    return select(func.json_each(json.dumps(values)).table_valued("value").c.value)
+
+
+def _search_columns(search_request: schemas.SearchRequest):
+    # Fuzzy matches need not contain the keyword verbatim
+    highlight = "" if search_request.fuzzy else search_request.keyword
+    return (
+        models.Note.id,
+        models.Note.title,
+        models.Note.area,
+        models.Note.tags,
+        models.Note.created_at,
+        _snippet_expression(highlight).label("snippet")
+    )
+
+
+def _search_result(row) -> schemas.SearchResult:
+    return schemas.SearchResult(
+        id=row.id,
+        title=row.title,
+        snippet=row.snippet,
+        area=row.area,
+        tags=row.tags,
+        created_at=row.created_at
+    )
+
+
+def _search_results_by_ids(
+    db: Session,
+    ids: List[int],
+    search_request: schemas.SearchRequest
 ) -> List[schemas.SearchResult]:
-    """Search notes with keyword and filters."""
-    query = db.query(models.Note)
+    """Load search results for cached ids, preserving their order."""
+    if not ids:
+        return []
+    rows = db.query(*_search_columns(search_request)).filter(
+        models.Note.id.in_(_json_values(ids))
+    ).all()
+    rows_by_id = {row.id: row for row in rows}
+    return [_search_result(rows_by_id[note_id]) for note_id in ids if note_id in rows_by_id]
+
+
+def _search_query(db: Session, search_request: schemas.SearchRequest):
+    """Build the filtered note query and its ordering for a search request.
     
+    Returns (None, None) when a fuzzy keyword cannot match any note.
+    """
+    query = db.query(models.Note)
+    order_by = []
+    
+    if search_request.fuzzy and search_request.keyword:
+        # Typo-tolerant search: rank by trigram similarity via the index,
+        # counting only terms from the requested fields
+        scores = search_index.fuzzy_scores(
+            db,
+            search_request.keyword,
+            search_index.search_fields(search_request.search_in)
+        )
+        if scores is None:
+            return None, None
+        query = query.join(scores, models.Note.id == scores.c.note_id)
+        order_by.append(scores.c.score.desc())
     # Apply keyword search with OR logic for fields
-    if search_request.keyword:
+    elif search_request.keyword:
         search_filters = []
         if "title" in search_request.search_in:
             search_filters.append(
@@ -164,33 +573,203 @@ def search_notes(
     # Apply tag filters with AND logic
     if search_request.tags:
         for tag in search_request.tags:
-            query = query.filter(models.Note.tags.contains(tag))
+            query = query.filter(_has_tag(tag))
     
     # Order by modified_at DESC
-    query = query.order_by(models.Note.modified_at.desc())
+    order_by.append(models.Note.modified_at.desc())
     
-    # Execute query
-    notes = query.all()
+    return query, order_by
+
+
+def _run_search(
+    db: Session,
+    search_request: schemas.SearchRequest
+) -> schemas.SearchResponse:
+    """Run a search against the database.
+    
+    Snippets are computed in SQL, so only the snippet window of each
+    matching note's plaintext is read into Python. With facets requested,
+    per-area and per-tag counts of the result set come from the same query.
+    """
+    query, order_by = _search_query(db, search_request)
+    if query is None:
+        return schemas.SearchResponse(
+            results=[],
+            total=0,
+            facets=schemas.SearchFacets(areas={}, tags={}) if search_request.facets else None
+        )
     
-    # Create search results with snippets
-    results = []
-    for note in notes:
-        # Create 150-character snippet from plaintext
-        snippet = note.plaintext[:150] if note.plaintext else ""
-        if len(note.plaintext or "") > 150:
-            snippet += "..."
-        
-        result = schemas.SearchResult(
-            id=note.id,
-            title=note.title,
-            snippet=snippet,
-            area=note.area,
-            tags=note.tags,
-            created_at=note.created_at
+    page = query.with_entities(*_search_columns(search_request))
+    if search_request.facets:
+        # Materialize the result set once; the rows and both facet counts
+        # are then read from it in a single statement
+        page = page.add_columns(func.row_number().over(order_by=order_by).label("position"))
+    page = page.order_by(*order_by)
+    
+    # Fuzzy results are ranked, so only the best matches are returned
+    if search_request.fuzzy and search_request.keyword:
+        page = page.limit(FUZZY_RESULT_LIMIT)
+    
+    # Execute query and build search results
+    if search_request.facets:
+        matches = page.cte("matches").prefix_with("MATERIALIZED")
+        rows = db.execute(
+            select(matches, *_facet_columns(matches)).order_by(matches.c.position)
+        ).all()
+    else:
+        rows = page.all()
+    results = [_search_result(row) for row in rows]
+    
+    facets = None
+    if search_request.facets:
+        facets = schemas.SearchFacets(
+            areas=json.loads(rows[0].area_facets) if rows else {},
+            tags=json.loads(rows[0].tag_facets) if rows else {}
         )
-        results.append(result)
     
-    return results
+    return schemas.SearchResponse(results=results, total=len(results), facets=facets)
+
+
+# Bulk Operations
+
+# Rewrite a note's JSON tags: drop :remove_tags, append new :add_tags in order
+_BULK_TAGS_SQL = """(
+    SELECT json_group_array(value) FROM (
+        SELECT 0 AS source, key, value FROM json_each(notes.tags)
+        WHERE value NOT IN (SELECT value FROM json_each(:remove_tags))
+        UNION ALL
+        SELECT 1, key, value FROM json_each(:add_tags)
+        WHERE value NOT IN (SELECT value FROM json_each(notes.tags))
+        ORDER BY source, key
+    )
+)"""
+
+# True when the tag rewrite above would change a note
+_BULK_TAGS_CHANGED_SQL = """(
+    EXISTS (
+        SELECT 1 FROM json_each(notes.tags)
+        WHERE value IN (SELECT value FROM json_each(:remove_tags))
+    )
+    OR EXISTS (
+        SELECT 1 FROM json_each(:add_tags)
+        WHERE value NOT IN (SELECT value FROM json_each(notes.tags))
+    )
+)"""
+
+
+def _bulk_note_ids(db: Session, selection: schemas.BulkNoteSelection) -> List[int]:
+    """Resolve a bulk selection to the ids of existing notes.
+    
+    A filter selects exactly the notes the same search would return.
+    Raises ValueError unless exactly one of ids, filter and all is given,
+    or if the filter restricts nothing: every note must be selected
+    explicitly with all.
+    """
+    given = [selection.ids is not None, selection.filter is not None, selection.all]
+    if given.count(True) != 1:
+        raise ValueError("Provide exactly one of ids, filter or all")
+    
+    if selection.all:
+        query = db.query(models.Note.id)
+    elif selection.ids is not None:
+        query = db.query(models.Note.id).filter(models.Note.id.in_(_json_values(selection.ids)))
+    else:
+        search_filter = selection.filter
+        keyword_used = bool(search_filter.keyword) and bool(
+            search_filter.fuzzy or {"title", "content"} & set(search_filter.search_in)
+        )
+        if not (keyword_used or search_filter.area or search_filter.tags):
+            raise ValueError('Filter selects every note; send "all": true to select all notes')
+        query, order_by = _search_query(db, search_filter)
+        if query is None:
+            return []
+        query = query.with_entities(models.Note.id)
+        if search_filter.fuzzy and search_filter.keyword:
+            query = query.order_by(*order_by).limit(FUZZY_RESULT_LIMIT)
+    return [note_id for note_id, in query]
+
+
+def bulk_update_notes(
+    db: Session,
+    bulk_update: schemas.BulkNoteUpdate
+) -> schemas.BulkOperationResponse:
+    """Set the area and/or add and remove tags on many notes in one transaction.
+    
+    Only metadata changes, so content is never re-derived and the search
+    and related-notes indexes are untouched. Notes already in the target
+    state are not written.
+    """
+    note_ids = _bulk_note_ids(db, bulk_update)
+    area_set = "area" in bulk_update.model_fields_set
+    add_tags = list(dict.fromkeys(bulk_update.add_tags))
+    remove_tags = list(dict.fromkeys(bulk_update.remove_tags))
+    if set(add_tags) & set(remove_tags):
+        raise ValueError("A tag cannot be both added and removed")
+    if not note_ids or not (area_set or add_tags or remove_tags):
+        return schemas.BulkOperationResponse(matched=len(note_ids), affected=0)
+    
+    params = {
+        "ids": json.dumps(note_ids),
+        "modified_at": datetime.utcnow(),
+        "area": bulk_update.area,
+        "add_tags": json.dumps(add_tags),
+        "remove_tags": json.dumps(remove_tags),
+    }
+    assignments = ["modified_at = :modified_at"]
+    changed = []
+    if area_set:
+        assignments.append("area = :area")
+        changed.append("area IS NOT :area")
+    if add_tags or remove_tags:
+        assignments.append(f"tags = {_BULK_TAGS_SQL}")
+        changed.append(_BULK_TAGS_CHANGED_SQL)
+    
+    # One UPDATE for every selected note that actually changes; modified_at
+    # is bound as DateTime so it is stored exactly like ORM writes
+    result = db.execute(text(
+        f"UPDATE notes SET {', '.join(assignments)} "
+        f"WHERE id IN (SELECT value FROM json_each(:ids)) AND ({' OR '.join(changed)})"
+    ).bindparams(bindparam("modified_at", type_=DateTime)), params)
+    
+    if remove_tags:
+        db.execute(
+            delete(models.NoteTag)
+            .where(models.NoteTag.note_id.in_(_json_values(note_ids)))
+            .where(models.NoteTag.tag.in_(remove_tags))
+        )
+    if add_tags:
+        db.execute(text(
+            "INSERT OR IGNORE INTO note_tags (note_id, tag) "
+            "SELECT ids.value, tags.value FROM json_each(:ids) AS ids, json_each(:add_tags) AS tags"
+        ), params)
+    
+    if result.rowcount:
+        _bump_write_generation(db)
+    db.commit()
+    return schemas.BulkOperationResponse(matched=len(note_ids), affected=result.rowcount)
+
+
+def bulk_delete_notes(
+    db: Session,
+    selection: schemas.BulkNoteSelection
+) -> schemas.BulkOperationResponse:
+    """Delete many notes, and their index entries, in one transaction."""
+    note_ids = _bulk_note_ids(db, selection)
+    if not note_ids:
+        return schemas.BulkOperationResponse(matched=0, affected=0)
+    
+    selected = _json_values(note_ids)
+    search_index.remove_notes(db, selected)
+    upload_gc.remove_notes(db, selected)
+    db.execute(delete(models.NoteTag).where(models.NoteTag.note_id.in_(selected)))
+    result = db.execute(
+        delete(models.Note).where(models.Note.id.in_(selected)),
+        execution_options={"synchronize_session": False}
+    )
+    _bump_write_generation(db)
+    db.commit()
+    related_index.update_notes(dict.fromkeys(note_ids))
+    return schemas.BulkOperationResponse(matched=len(note_ids), affected=result.rowcount)
 
 
 # Calendar Operations
@@ -251,12 +830,11 @@ def get_statistics(db: Session) -> schemas.StatisticsResponse:
         for area, count in notes_by_area_query
     }
     
-    # Notes by tag - iterate all notes and tally tag occurrences
-    all_notes = db.query(models.Note).all()
-    notes_by_tag: Dict[str, int] = {}
-    for note in all_notes:
-        for tag in note.tags:
-            notes_by_tag[tag] = notes_by_tag.get(tag, 0) + 1
+    # Notes by tag - counted from the note_tags association table
+    notes_by_tag: Dict[str, int] = dict(db.query(
+        models.NoteTag.tag,
+        func.count(models.NoteTag.note_id)
+    ).group_by(models.NoteTag.tag).all())
     
     # Notes from last 7 days
     week_ago = datetime.utcnow() - timedelta(days=7)
@@ -322,6 +900,83 @@ def create_tag(db: Session, tag: schemas.TagCreate) -> models.Tag:
     return db_tag
 
 
+# Replace one tag with another in every note's JSON tags, keeping each
+# tag's first position and dropping the duplicate when a note has both
+_REPLACE_TAG_SQL = """
+UPDATE notes SET tags = (
+    SELECT json_group_array(value) FROM (
+        SELECT min(key) AS position, value FROM (
+            SELECT key, CASE WHEN value = :old THEN :new ELSE value END AS value
+            FROM json_each(notes.tags)
+        )
+        GROUP BY value
+        ORDER BY position
+    )
+)
+WHERE id IN (SELECT note_id FROM note_tags WHERE tag = :old)
+"""
+
+
+def _replace_note_tag(db: Session, old: str, new: str) -> int:
+    """Rewrite tag membership old -> new across all notes (caller commits).
+    
+    Notes are found through note_tags, so only notes carrying the tag are
+    touched. modified_at is left alone: the notes' content did not change.
+    
+    Returns:
+        Number of notes updated
+    """
+    params = {"old": old, "new": new}
+    result = db.execute(text(_REPLACE_TAG_SQL), params)
+    db.execute(text(
+        "INSERT OR IGNORE INTO note_tags (note_id, tag) "
+        "SELECT note_id, :new FROM note_tags WHERE tag = :old"
+    ), params)
+    db.execute(delete(models.NoteTag).where(models.NoteTag.tag == old))
+    if result.rowcount:
+        _bump_write_generation(db)
+    return result.rowcount
+
+
+def update_tag(db: Session, tag_id: int, tag_update: schemas.TagUpdate) -> Optional[models.Tag]:
+    """Rename and/or recolor a tag; a rename is applied to every note in one transaction."""
+    db_tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+    if not db_tag:
+        return None
+    
+    if tag_update.name is not None and tag_update.name != db_tag.name:
+        existing_tag = db.query(models.Tag).filter(models.Tag.name == tag_update.name).first()
+        if existing_tag:
+            raise ValueError(f"Tag with name '{tag_update.name}' already exists; merge into it instead")
+        _replace_note_tag(db, db_tag.name, tag_update.name)
+        db_tag.name = tag_update.name
+    if tag_update.color is not None:
+        db_tag.color = tag_update.color
+    
+    db.commit()
+    db.refresh(db_tag)
+    return db_tag
+
+
+def merge_tag(db: Session, tag_id: int, tag_merge: schemas.TagMerge) -> Optional[schemas.TagMergeResponse]:
+    """Merge a tag into another existing tag and delete it, in one transaction."""
+    db_tag = db.query(models.Tag).filter(models.Tag.id == tag_id).first()
+    if not db_tag:
+        return None
+    
+    target_tag = db.query(models.Tag).filter(models.Tag.name == tag_merge.into).first()
+    if not target_tag:
+        raise ValueError(f"Tag '{tag_merge.into}' does not exist")
+    if target_tag.id == db_tag.id:
+        raise ValueError("Cannot merge a tag into itself")
+    
+    notes_updated = _replace_note_tag(db, db_tag.name, target_tag.name)
+    db.delete(db_tag)
+    db.commit()
+    db.refresh(target_tag)
+    return schemas.TagMergeResponse(tag=target_tag, notes_updated=notes_updated)
+
+
 # Setting Operations
 
 def get_settings(db: Session) -> List[models.Setting]:
@@ -1,6 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
-from app.models import Base, Area, Tag, Setting
+from app.models import Base, Note, Area, Tag, Setting, SchemaVersion, WriteGeneration
+from app.utils import content_hash
+from app import search_index, upload_gc
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./notes.db"
 
@@ -10,6 +13,10 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Bump whenever tables, indexes or seed data change so that existing
+# databases are migrated by init_db on the next startup.
+SCHEMA_VERSION = 9
+
 
 def get_db():
     """Dependency function to get database session."""
@@ -20,14 +27,81 @@ def get_db():
         db.close()
 
 
+def get_schema_version() -> int:
+    """Return the schema version stored in the database (0 if none)."""
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(
+                text("SELECT MAX(version) FROM schema_version")
+            ).scalar()
+    except OperationalError:
+        # Table does not exist yet (fresh or pre-versioning database)
+        return 0
+    return version or 0
+
+
+def migrate_note_content_hash(db):
+    """Add and backfill notes.content_hash on databases created before v2."""
+    columns = {column["name"] for column in inspect(db.bind).get_columns("notes")}
+    if "content_hash" not in columns:
+        db.execute(text("ALTER TABLE notes ADD COLUMN content_hash VARCHAR"))
+    
+    rows = db.query(Note.id, Note.html_content).filter(Note.content_hash.is_(None)).all()
+    if rows:
+        db.bulk_update_mappings(Note, [
+            {"id": note_id, "content_hash": content_hash(html_content or "")}
+            for note_id, html_content in rows
+        ])
+
+
+def migrate_note_tags(db):
+    """Populate note_tags from the JSON tags arrays on existing notes."""
+    db.execute(text("DELETE FROM note_tags"))
+    db.execute(text(
+        "INSERT OR IGNORE INTO note_tags (note_id, tag) "
+        "SELECT notes.id, json_each.value FROM notes, json_each(notes.tags)"
+    ))
+
+
+def migrate_note_term_fields(db):
+    """Add note_terms.fields and reindex so postings record their field."""
+    columns = {column["name"] for column in inspect(db.bind).get_columns("note_terms")}
+    if "fields" not in columns:
+        db.execute(text("ALTER TABLE note_terms ADD COLUMN fields INTEGER NOT NULL DEFAULT 3"))
+    search_index.rebuild_index(db)
+
+
 def init_db():
     """Initialize database with tables and seed data."""
+    # A current database needs neither create_all nor seeding
+    version = get_schema_version()
+    if version >= SCHEMA_VERSION:
+        return
+    
     # Create all tables (indexes are defined in Note.__table_args__)
     Base.metadata.create_all(bind=engine)
     
     # Seed initial data
     db = SessionLocal()
     try:
+        # Bring tables created by older versions up to date
+        if version < 2:
+            migrate_note_content_hash(db)
+        if version < 3:
+            search_index.rebuild_index(db)
+        if version < 4:
+            migrate_note_tags(db)
+        if version < 9:
+            # Also picks up unquoted src references missed before v9
+            upload_gc.rebuild_references(db)
+        if version < 7:
+            # Terms left behind before unused terms were pruned on save
+            search_index.prune_terms(db)
+        if version < 8:
+            migrate_note_term_fields(db)
+        if not db.query(WriteGeneration).first():
+            db.add(WriteGeneration(id=1, value=0))
+        
         # Seed areas
         initial_areas = [
             {"name": "Learning", "color": "#10B981"},
@@ -71,6 +145,10 @@ def init_db():
                 setting = Setting(**setting_data)
                 db.add(setting)
         
+        # Record the schema version so later startups can skip this work
+        db.query(SchemaVersion).delete()
+        db.add(SchemaVersion(version=SCHEMA_VERSION))
+        
         db.commit()
     except Exception as e:
         db.rollback()
@@ -15,6 +15,7 @@ class Note(Base):
     markdown_content = Column(Text, nullable=True)
     area = Column(String, nullable=True)
     tags = Column(JSON, nullable=False, default=list)
+    content_hash = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     modified_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -58,3 +59,108 @@ class Setting(Base):
     
     def __repr__(self):
         return f"<Setting(key='{self.key}', value='{self.value}')>"
+
+
+class NoteTag(Base):
+    __tablename__ = "note_tags"
+    
+    # Mirrors Note.tags so tag queries can use an index instead of JSON scans
+    note_id = Column(Integer, primary_key=True)
+    tag = Column(String, primary_key=True)
+    
+    __table_args__ = (
+        Index('idx_note_tags_tag', 'tag', 'note_id'),
+        {"sqlite_with_rowid": False},
+    )
+    
+    def __repr__(self):
+        return f"<NoteTag(note_id={self.note_id}, tag='{self.tag}')>"
+
+
+class NoteImage(Base):
+    __tablename__ = "note_images"
+    
+    # Uploaded images referenced by each note's HTML, so the upload GC can
+    # tell whether a file is still in use without scanning note content
+    note_id = Column(Integer, primary_key=True)
+    filename = Column(String, primary_key=True)
+    
+    __table_args__ = (
+        Index('idx_note_images_filename', 'filename', 'note_id'),
+        {"sqlite_with_rowid": False},
+    )
+    
+    def __repr__(self):
+        return f"<NoteImage(note_id={self.note_id}, filename='{self.filename}')>"
+
+
+class OrphanCandidate(Base):
+    __tablename__ = "orphan_candidates"
+    
+    # Uploads that were new or lost a reference at `since`; the upload GC
+    # deletes them after a grace period unless a note refers to them again
+    filename = Column(String, primary_key=True)
+    since = Column(DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<OrphanCandidate(filename='{self.filename}', since={self.since})>"
+
+
+class WriteGeneration(Base):
+    __tablename__ = "write_generation"
+    
+    # Single row bumped by every note write; lets each worker process tell
+    # whether its cached search results are still current
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<WriteGeneration(value={self.value})>"
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    
+    version = Column(Integer, primary_key=True)
+    
+    def __repr__(self):
+        return f"<SchemaVersion(version={self.version})>"
+
+
+# Fuzzy search index: distinct words from note titles and plaintext, their
+# trigrams, and which notes contain them (maintained by app.search_index)
+
+class SearchTerm(Base):
+    __tablename__ = "search_terms"
+    
+    id = Column(Integer, primary_key=True)
+    term = Column(String, unique=True, nullable=False)
+    trigram_count = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<SearchTerm(term='{self.term}')>"
+
+
+class TermTrigram(Base):
+    __tablename__ = "term_trigrams"
+    
+    trigram = Column(String, primary_key=True)
+    term_id = Column(Integer, primary_key=True)
+    
+    __table_args__ = (
+        {"sqlite_with_rowid": False},
+    )
+
+
+class NoteTerm(Base):
+    __tablename__ = "note_terms"
+    
+    note_id = Column(Integer, primary_key=True)
+    term_id = Column(Integer, primary_key=True)
+    # Bit mask of the fields the term occurs in (see search_index.TITLE_FIELD)
+    fields = Column(Integer, nullable=False, default=3)
+    
+    __table_args__ = (
+        Index('idx_note_terms_term', 'term_id', 'note_id'),
+        {"sqlite_with_rowid": False},
+    )
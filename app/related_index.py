@@ -0,0 +1,580 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import uuid
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+# NumPy and SciPy are imported inside the functions that use them so that
+# importing this module (from crud) stays cheap.
+
+logger = logging.getLogger(__name__)
+
+RELATED_INDEX_DIR = "related_index"
+
+# Terms are hashed into a fixed number of columns, so no vocabulary has to
+# be shared between processes
+N_FEATURES = 1 << 20
+
+# Rewrite the whole index once the delta segment or the share of deleted
+# rows grows past these limits. Compaction runs in the background (see
+# IndexCompactor); writers only compact themselves, as a fallback, once
+# the limits are exceeded INLINE_COMPACT_FACTOR times over.
+MAX_DELTA_ROWS = 2000
+MAX_DEAD_FRACTION = 0.25
+INLINE_COMPACT_FACTOR = 4
+
+# Seconds between background checks for a due compaction
+COMPACT_INTERVAL = 5.0
+
+_WORD_RE = re.compile(r"\w+")
+
+_process_lock = threading.Lock()
+_cache = {"generation": None, "index": None}
+
+
+def _term_weights(plaintext: Optional[str]) -> Dict[int, float]:
+    """Map hashed term columns to sublinear term frequencies (1 + log tf)."""
+    counts = Counter(
+        zlib.crc32(word.encode("utf-8")) % N_FEATURES
+        for word in _WORD_RE.findall((plaintext or "").lower())
+        if len(word) >= 2
+    )
+    return {column: 1.0 + math.log(count) for column, count in counts.items()}
+
+
+def _path(name: str) -> str:
+    return os.path.join(RELATED_INDEX_DIR, name)
+
+
+def _read_manifest() -> Optional[dict]:
+    try:
+        with open(_path("manifest.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(manifest: dict):
+    # Atomic replace so readers always see a complete, consistent index
+    temp_path = _path("manifest.json.tmp")
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, _path("manifest.json"))
+
+
+@contextmanager
+def _write_lock():
+    """Serialize index writers within and across worker processes."""
+    os.makedirs(RELATED_INDEX_DIR, exist_ok=True)
+    with _process_lock:
+        with open(_path(".lock"), "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+def _csr_arrays(rows: List[Dict[int, float]], index_dtype=None):
+    """Build CSR (indptr, indices, data) arrays from term weight rows."""
+    import numpy as np
+    
+    nnz = sum(len(row) for row in rows)
+    if index_dtype is None:
+        # Same index dtype SciPy would pick, so loading never has to convert (copy)
+        index_dtype = np.int32 if nnz < 2 ** 31 else np.int64
+    indptr = np.zeros(len(rows) + 1, dtype=index_dtype)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    indices = np.fromiter(
+        (column for row in rows for column in sorted(row)), dtype=index_dtype, count=nnz
+    )
+    data = np.fromiter(
+        (row[column] for row in rows for column in sorted(row)), dtype=np.float32, count=nnz
+    )
+    return indptr, indices, data
+
+
+def _save_segment(name: str, note_ids, rows: List[Dict[int, float]]):
+    """Write a CSR segment as .npy files that can be memory-mapped."""
+    import numpy as np
+    
+    _save_arrays(name, np.asarray(note_ids, dtype=np.int64), *_csr_arrays(rows))
+
+
+def _save_arrays(name: str, note_ids, indptr, indices, data):
+    import numpy as np
+    
+    for suffix, array in (("note_ids", note_ids), ("indptr", indptr), ("indices", indices), ("data", data)):
+        np.save(_path(f"{name}.{suffix}.npy"), array)
+
+
+def _load_segment(name: str):
+    """Load a segment as (note_ids, csr_matrix) backed by read-only mmaps."""
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    
+    arrays = {
+        suffix: np.load(_path(f"{name}.{suffix}.npy"), mmap_mode="r")
+        for suffix in ("note_ids", "indptr", "indices", "data")
+    }
+    matrix = csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]),
+        shape=(len(arrays["note_ids"]), N_FEATURES),
+        copy=False
+    )
+    return arrays["note_ids"], matrix
+
+
+def _idf(df, row_count: int):
+    import numpy as np
+    
+    return (np.log((1 + row_count) / (1 + df)) + 1).astype(np.float32)
+
+
+def _row_norms(matrix, idf):
+    """TF-IDF vector length of every row."""
+    import numpy as np
+    
+    return np.sqrt(matrix.multiply(matrix) @ (idf * idf)).astype(np.float32)
+
+
+def _save_base_stats(name: str, matrix):
+    """Store a base segment's document frequencies and row norms.
+    
+    Readers then only adjust them for delta and dead rows instead of
+    scanning the whole base every generation.
+    """
+    import numpy as np
+    
+    df = np.bincount(matrix.indices, minlength=N_FEATURES).astype(np.int32)
+    np.save(_path(f"{name}.df.npy"), df)
+    np.save(_path(f"{name}.norms.npy"), _row_norms(matrix, _idf(df, matrix.shape[0])))
+
+
+def _load_base_stats(name: str, matrix):
+    """Load (df, norms) of a base segment, computing them for older indexes."""
+    import numpy as np
+    
+    try:
+        return (
+            np.load(_path(f"{name}.df.npy"), mmap_mode="r"),
+            np.load(_path(f"{name}.norms.npy"), mmap_mode="r")
+        )
+    except FileNotFoundError:
+        if not os.path.exists(_path(f"{name}.indptr.npy")):
+            raise
+    df = np.bincount(matrix.indices, minlength=N_FEATURES)
+    return df, _row_norms(matrix, _idf(df, matrix.shape[0]))
+
+
+def _remove_segment_files(name: str):
+    for suffix in ("note_ids", "indptr", "indices", "data", "df", "norms"):
+        try:
+            os.remove(_path(f"{name}.{suffix}.npy"))
+        except OSError:
+            # Another process may still have it mapped (Windows)
+            pass
+
+
+def _read_notes(db: Session, batch_size: int = 2000):
+    note_ids = []
+    rows = []
+    last_id = 0
+    while True:
+        batch = db.execute(
+            select(models.Note.id, models.Note.plaintext)
+            .where(models.Note.id > last_id)
+            .order_by(models.Note.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        for note_id, plaintext in batch:
+            note_ids.append(note_id)
+            rows.append(_term_weights(plaintext))
+        last_id = batch[-1][0]
+    return note_ids, rows
+
+
+def rebuild(db: Session) -> int:
+    """Rebuild the related-notes index from every note's stored plaintext.
+    
+    Returns:
+        Number of notes indexed
+    """
+    note_ids, rows = _read_notes(db)
+    with _write_lock():
+        _replace_index(note_ids, rows)
+    return len(note_ids)
+
+
+def ensure_built(db: Session) -> bool:
+    """Build the index unless one exists; meant for application startup.
+    
+    Returns:
+        True if the index was built
+    """
+    with _write_lock():
+        if _read_manifest() is not None:
+            return False
+        # Under the lock, so concurrently starting workers build it once
+        _replace_index(*_read_notes(db))
+    return True
+
+
+def _replace_index(note_ids, rows):
+    """Write a new base segment with an empty delta and swap it in.
+    
+    note_ids must be in ascending order, as _read_notes returns them.
+    """
+    previous = _read_manifest()
+    generation = previous["generation"] + 1 if previous else 1
+    base = f"base-{generation}"
+    delta = f"delta-{generation}"
+    _save_segment(base, note_ids, rows)
+    _save_base_stats(base, _load_segment(base)[1])
+    _save_segment(delta, [], [])
+    _write_manifest({
+        "generation": generation,
+        "base": base,
+        "delta": delta,
+        "dead": [],
+        "base_sorted": True
+    })
+    if previous:
+        _remove_segment_files(previous["base"])
+        _remove_segment_files(previous["delta"])
+
+
+def update_notes(changes: Dict[int, Optional[str]]):
+    """Apply note changes to the index: note id -> new plaintext, or None if deleted.
+    
+    The index is derived data, so failures are logged rather than raised;
+    a rebuild repairs it. Does nothing until the index has been built.
+    """
+    if not changes:
+        return
+    try:
+        with _write_lock():
+            _apply_changes(changes)
+    except Exception:
+        logger.exception("Failed to update related-notes index")
+
+
+def _base_rows(manifest: dict, base_ids, note_ids):
+    """Rows of the base segment holding any of note_ids."""
+    import numpy as np
+    
+    if not manifest.get("base_sorted"):
+        # Written before bases were kept in id order
+        return np.nonzero(np.isin(base_ids, note_ids))[0]
+    positions = np.searchsorted(base_ids, note_ids)
+    found = positions < len(base_ids)
+    positions = positions[found]
+    return positions[base_ids[positions] == note_ids[found]]
+
+
+def _needs_compaction(manifest: dict, base_rows: int, delta_rows: int, factor: float = 1) -> bool:
+    total_rows = base_rows + delta_rows
+    return (
+        delta_rows > MAX_DELTA_ROWS * factor
+        or len(manifest["dead"]) > MAX_DEAD_FRACTION * factor * total_rows
+    )
+
+
+def _apply_changes(changes: Dict[int, Optional[str]]):
+    import numpy as np
+    
+    manifest = _read_manifest()
+    if manifest is None:
+        return
+    
+    base_ids, _ = _load_segment(manifest["base"])
+    delta_ids, delta_matrix = _load_segment(manifest["delta"])
+    
+    # Tombstone every existing row of a changed note: a binary search in
+    # the id-ordered base, a scan of the small delta
+    changed = np.unique(np.fromiter(changes, dtype=np.int64, count=len(changes)))
+    dead = set(manifest["dead"])
+    dead.update(int(row) for row in _base_rows(manifest, base_ids, changed))
+    dead.update(int(row) + len(base_ids) for row in np.nonzero(np.isin(delta_ids, changed))[0])
+    
+    # Rows for created/updated notes are appended to the delta arrays as
+    # they are; only the new rows are built in Python
+    new_rows = [(note_id, _term_weights(text)) for note_id, text in changes.items() if text is not None]
+    indptr, indices, data = _csr_arrays(
+        [row for _, row in new_rows], index_dtype=delta_matrix.indptr.dtype
+    )
+    generation = manifest["generation"] + 1
+    delta = f"delta-{generation}"
+    _save_arrays(
+        delta,
+        np.concatenate([delta_ids, np.array([note_id for note_id, _ in new_rows], dtype=np.int64)]),
+        np.concatenate([delta_matrix.indptr, indptr[1:] + delta_matrix.indptr[-1]]),
+        np.concatenate([delta_matrix.indices, indices]),
+        np.concatenate([delta_matrix.data, data])
+    )
+    updated = dict(manifest, generation=generation, delta=delta, dead=sorted(dead))
+    _write_manifest(updated)
+    _remove_segment_files(manifest["delta"])
+    
+    delta_rows = len(delta_ids) + len(new_rows)
+    if _needs_compaction(updated, len(base_ids), delta_rows, factor=INLINE_COMPACT_FACTOR):
+        # No background compactor is keeping up; do it here
+        _install_compacted(updated, *_merge_segments(updated))
+
+
+def _merge_segments(manifest: dict):
+    """Write a new base segment holding the live rows of a generation, in id order.
+    
+    Returns:
+        (new base name, array mapping each old row to its row in the new
+        base or -1 for dead rows)
+    """
+    import numpy as np
+    from scipy.sparse import vstack
+    
+    base_ids, base_matrix = _load_segment(manifest["base"])
+    delta_ids, delta_matrix = _load_segment(manifest["delta"])
+    
+    live = np.ones(len(base_ids) + len(delta_ids), dtype=bool)
+    live[manifest["dead"]] = False
+    live_rows = np.nonzero(live)[0]
+    note_ids = np.concatenate([base_ids, delta_ids])[live_rows]
+    order = np.argsort(note_ids, kind="stable")
+    merged = vstack([base_matrix, delta_matrix], format="csr")[live_rows[order]]
+    
+    row_map = np.full(len(live), -1, dtype=np.int64)
+    row_map[live_rows[order]] = np.arange(len(order))
+    
+    # Not named after a generation: it is only numbered once installed, and
+    # an unused one (another compaction won) is simply removed
+    base = f"base-{uuid.uuid4().hex}"
+    _save_arrays(base, note_ids[order], merged.indptr, merged.indices, merged.data)
+    _save_base_stats(base, merged)
+    return base, row_map
+
+
+def _install_compacted(current: dict, base: str, row_map):
+    """Swap in a base segment built from the merged generation.
+    
+    Rows written to the delta since then (it only grows between
+    compactions) become the new delta, and rows that died meanwhile are
+    carried over as dead rows of the new base. The caller holds the write
+    lock.
+    """
+    import numpy as np
+    
+    base_ids, _ = _load_segment(current["base"])
+    delta_ids, delta_matrix = _load_segment(current["delta"])
+    base_rows = int(row_map.max()) + 1 if len(row_map) else 0
+    merged_rows = len(row_map)
+    first_new = merged_rows - len(base_ids)
+    
+    dead = set()
+    for row in current["dead"]:
+        if row < merged_rows:
+            if row_map[row] >= 0:
+                dead.add(int(row_map[row]))
+        else:
+            dead.add(base_rows + row - merged_rows)
+    
+    indptr = delta_matrix.indptr[first_new:]
+    generation = current["generation"] + 1
+    delta = f"delta-{generation}"
+    _save_arrays(
+        delta,
+        np.array(delta_ids[first_new:]),
+        indptr - indptr[0],
+        np.array(delta_matrix.indices[indptr[0]:indptr[-1]]),
+        np.array(delta_matrix.data[indptr[0]:indptr[-1]])
+    )
+    _write_manifest({
+        "generation": generation,
+        "base": base,
+        "delta": delta,
+        "dead": sorted(dead),
+        "base_sorted": True
+    })
+    _remove_segment_files(current["base"])
+    _remove_segment_files(current["delta"])
+
+
+def compact() -> bool:
+    """Compact the index if it is due, keeping writers blocked only briefly.
+    
+    The new base is written from a snapshot without holding the write
+    lock; the lock is only taken to fold in changes made meanwhile and
+    swap the base in.
+    
+    Returns:
+        True if the index was compacted
+    """
+    manifest = _read_manifest()
+    if manifest is None:
+        return False
+    try:
+        base_ids, _ = _load_segment(manifest["base"])
+        delta_ids, _ = _load_segment(manifest["delta"])
+        if not _needs_compaction(manifest, len(base_ids), len(delta_ids)):
+            return False
+        base, row_map = _merge_segments(manifest)
+    except FileNotFoundError:
+        # Superseded while reading; the next check sees the newer generation
+        return False
+    
+    with _write_lock():
+        current = _read_manifest()
+        # Only the delta may have changed since the snapshot; a new base
+        # means another process compacted first
+        if current is None or current["base"] != manifest["base"]:
+            _remove_segment_files(base)
+            return False
+        _install_compacted(current, base, row_map)
+    return True
+
+
+class IndexCompactor:
+    """
+    Background thread that compacts the related-notes index when it is
+    due, so saves never pay for a compaction.
+    """
+    
+    def __init__(self, interval: float = COMPACT_INTERVAL):
+        self.interval = interval
+        self.compaction_count = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start the background compaction thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="related-index-compactor", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the compaction thread (a running compaction finishes first)."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if compact():
+                    self.compaction_count += 1
+            except Exception:
+                logger.exception("Failed to compact related-notes index")
+
+
+class _LoadedIndex:
+    """An index generation loaded for querying, with IDF and row norms.
+    
+    The base and delta segments are kept as separate matrices so that the
+    large base stays a read-only memory map shared by every worker. The
+    base's stored document frequencies are only corrected for dead and
+    delta rows; base row norms keep the IDF from when the base was written
+    until the next compaction.
+    """
+    
+    def __init__(self, manifest: dict):
+        import numpy as np
+        
+        base_ids, base_matrix = _load_segment(manifest["base"])
+        base_df, base_norms = _load_base_stats(manifest["base"], base_matrix)
+        delta_ids, delta_matrix = _load_segment(manifest["delta"])
+        self.segments = [base_matrix, delta_matrix]
+        self.note_ids = np.concatenate([base_ids, delta_ids])
+        
+        self.live = np.ones(len(self.note_ids), dtype=bool)
+        self.live[manifest["dead"]] = False
+        
+        # Document frequency over live rows only
+        df = np.array(base_df, dtype=np.int64)
+        dead_base_rows = [row for row in manifest["dead"] if row < len(base_ids)]
+        if dead_base_rows:
+            indptr = base_matrix.indptr
+            df -= np.bincount(np.concatenate([
+                base_matrix.indices[indptr[row]:indptr[row + 1]] for row in dead_base_rows
+            ]), minlength=N_FEATURES)
+        live_delta = np.repeat(self.live[len(base_ids):], np.diff(delta_matrix.indptr))
+        df += np.bincount(delta_matrix.indices[live_delta], minlength=N_FEATURES)
+        self.idf = _idf(df, int(self.live.sum()))
+        
+        self.norms = np.concatenate([base_norms, _row_norms(delta_matrix, self.idf)])
+    
+    def scores(self, vector):
+        """Dot product of every row with a dense query vector."""
+        import numpy as np
+        
+        return np.concatenate([matrix @ vector for matrix in self.segments])
+
+
+def _loaded_index() -> Optional[_LoadedIndex]:
+    manifest = _read_manifest()
+    while manifest is not None and _cache["generation"] != manifest["generation"]:
+        try:
+            index = _LoadedIndex(manifest)
+        except FileNotFoundError:
+            # A writer swapped in a newer generation and removed this one's
+            # files while we were loading them; load the newer one instead
+            latest = _read_manifest()
+            if latest is None or latest["generation"] == manifest["generation"]:
+                raise
+            manifest = latest
+            continue
+        _cache["index"] = index
+        _cache["generation"] = manifest["generation"]
+    return _cache["index"] if manifest is not None else None
+
+
+def related_notes(note_id: int, plaintext: Optional[str], limit: int = 10) -> List[Tuple[int, float]]:
+    """Return up to limit (note_id, cosine similarity) pairs most similar to a note.
+    
+    Returns nothing until the index has been built (see ensure_built).
+    """
+    import numpy as np
+    
+    index = _loaded_index()
+    if index is None:
+        return []
+    
+    weights = _term_weights(plaintext)
+    if not weights:
+        return []
+    columns = np.fromiter(weights, dtype=np.int64, count=len(weights))
+    query = np.fromiter(weights.values(), dtype=np.float32, count=len(weights)) * index.idf[columns]
+    query_norm = float(np.linalg.norm(query))
+    if query_norm == 0:
+        return []
+    
+    # Cosine similarity against every row in one sparse matrix-vector product
+    vector = np.zeros(N_FEATURES, dtype=np.float32)
+    vector[columns] = query * index.idf[columns]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = index.scores(vector) / (index.norms * query_norm)
+    scores[~index.live | (index.note_ids == note_id) | ~np.isfinite(scores)] = 0
+    
+    limit = min(limit, len(scores))
+    if limit == 0:
+        return []
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    top = top[np.argsort(-scores[top])]
+    return [(int(index.note_ids[row]), float(scores[row])) for row in top if scores[row] > 0]
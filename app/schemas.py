@@ -20,11 +20,37 @@ class NoteUpdate(BaseModel):
     tags: Optional[List[str]] = None
 
 
+class TextEdit(BaseModel):
+    """Replace base[start:end] with text (offsets in Unicode code points)."""
+    start: int = Field(ge=0)
+    end: int = Field(ge=0)
+    text: str = ""
+
+
+class NotePatch(BaseModel):
+    base_hash: str
+    edits: List[TextEdit] = []
+    area: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+
 class NoteResponse(NoteBase):
     id: int
     title: str
     plaintext: Optional[str] = None
     markdown_content: Optional[str] = None
+    content_hash: Optional[str] = None
+    created_at: datetime
+    modified_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class NotePatchResponse(BaseModel):
+    id: int
+    title: str
+    content_hash: str
     created_at: datetime
     modified_at: datetime
     
@@ -37,12 +63,26 @@ class NoteListResponse(BaseModel):
     total: int
 
 
+class RelatedNote(BaseModel):
+    id: int
+    title: str
+    area: Optional[str] = None
+    tags: List[str]
+    score: float
+
+
+class RelatedNotesResponse(BaseModel):
+    related: List[RelatedNote]
+
+
 # Search Schemas
 class SearchRequest(BaseModel):
     keyword: str = ""
     area: Optional[str] = None
     tags: List[str] = []
     search_in: List[str] = ["title", "content"]
+    fuzzy: bool = False
+    facets: bool = False
 
 
 class SearchResult(BaseModel):
@@ -57,9 +97,41 @@ class SearchResult(BaseModel):
         from_attributes = True
 
 
+class SearchFacets(BaseModel):
+    areas: dict[str, int]
+    tags: dict[str, int]
+
+
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     total: int
+    facets: Optional[SearchFacets] = None
+
+
+class SearchCacheStats(BaseModel):
+    hits: int
+    misses: int
+    entries: int
+    cached_ids: int
+
+
+# Bulk Operation Schemas
+class BulkNoteSelection(BaseModel):
+    """Explicit note ids, a search filter, or all=True selecting the notes."""
+    ids: Optional[List[int]] = None
+    filter: Optional[SearchRequest] = None
+    all: bool = False
+
+
+class BulkNoteUpdate(BulkNoteSelection):
+    area: Optional[str] = None
+    add_tags: List[str] = []
+    remove_tags: List[str] = []
+
+
+class BulkOperationResponse(BaseModel):
+    matched: int
+    affected: int
 
 
 # Area Schemas
@@ -96,6 +168,20 @@ class TagResponse(TagBase):
         from_attributes = True
 
 
+class TagUpdate(BaseModel):
+    name: Optional[str] = None
+    color: Optional[str] = None
+
+
+class TagMerge(BaseModel):
+    into: str
+
+
+class TagMergeResponse(BaseModel):
+    tag: TagResponse
+    notes_updated: int
+
+
 # Setting Schemas
 class SettingBase(BaseModel):
     key: str
@@ -149,3 +235,15 @@ class StatisticsResponse(BaseModel):
     notes_by_tag: dict[str, int]
     notes_this_week: int
     notes_this_month: int
+
+
+# Backup Schemas
+class BackupResponse(BaseModel):
+    archive: str
+    created_at: datetime
+    duration_seconds: float
+    database_bytes: int
+    uploads_total: int
+    uploads_copied: int
+    uploads_bytes_copied: int
+    throughput_mb_per_second: float
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+from app import schemas
+
+# Cached result id lists are bounded both by count and by total size
+MAX_ENTRIES = 256
+MAX_CACHED_IDS = 200000
+
+
+def cache_key(search_request: schemas.SearchRequest) -> Hashable:
+    """Normalize a search request into a cache key.
+    
+    Tag filters use AND logic and search_in is a set of fields, so their
+    order does not matter. ASCII keywords are lowercased because LIKE and
+    the fuzzy index are case-insensitive for ASCII.
+    """
+    keyword = search_request.keyword
+    if keyword.isascii():
+        keyword = keyword.lower()
+    return (
+        keyword,
+        search_request.area or None,
+        tuple(sorted(set(search_request.tags))),
+        tuple(sorted(set(search_request.search_in))),
+        search_request.fuzzy,
+        search_request.facets,
+    )
+
+
+class SearchCache:
+    """
+    LRU cache of search result ids (and facets) for one worker process.
+    
+    Entries are tagged with the database write generation they were
+    computed at; a lookup with a newer generation is a miss, so writes made
+    by any process invalidate every worker's cache.
+    """
+    
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_ids: int = MAX_CACHED_IDS):
+        self.max_entries = max_entries
+        self.max_ids = max_ids
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, List[int], Optional[schemas.SearchFacets]]]" = OrderedDict()
+        self._cached_ids = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable, generation: int) -> Optional[Tuple[List[int], Optional[schemas.SearchFacets]]]:
+        """Return (ids, facets) cached for key at this generation, if any."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+    
+    def put(self, key: Hashable, generation: int, ids: List[int], facets: Optional[schemas.SearchFacets]):
+        """Cache a result, evicting least recently used entries to stay in bounds."""
+        if len(ids) > self.max_ids:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._cached_ids -= len(previous[1])
+            self._entries[key] = (generation, ids, facets)
+            self._cached_ids += len(ids)
+            while len(self._entries) > self.max_entries or self._cached_ids > self.max_ids:
+                _, evicted = self._entries.popitem(last=False)
+                self._cached_ids -= len(evicted[1])
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._cached_ids = 0
+    
+    def stats(self) -> schemas.SearchCacheStats:
+        with self._lock:
+            return schemas.SearchCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                entries=len(self._entries),
+                cached_ids=self._cached_ids,
+            )
+
+
+search_cache = SearchCache()
@@ -0,0 +1,306 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, case, delete, exists, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Words shorter than this are too ambiguous to match fuzzily
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 40
+
+# Minimum trigram similarity for a vocabulary term to match a query word
+SIMILARITY_THRESHOLD = 0.3
+
+# Bounds that keep fuzzy query latency independent of corpus size
+MAX_QUERY_WORDS = 8
+MAX_TERMS_PER_WORD = 20
+
+# Bits of NoteTerm.fields: which parts of a note a term occurs in
+TITLE_FIELD = 1
+CONTENT_FIELD = 2
+ALL_FIELDS = TITLE_FIELD | CONTENT_FIELD
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> Set[str]:
+    """Split text into the set of distinct lowercase index terms."""
+    return {
+        word for word in _WORD_RE.findall(text.lower())
+        if MIN_TERM_LENGTH <= len(word) <= MAX_TERM_LENGTH
+    }
+
+
+def trigrams(word: str) -> Set[str]:
+    """Return the padded trigrams of a word (two spaces before, one after)."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _note_terms(title: Optional[str], plaintext: Optional[str]) -> Dict[str, int]:
+    """Map each of a note's terms to the fields it occurs in."""
+    terms = dict.fromkeys(tokenize(title or ""), TITLE_FIELD)
+    for term in tokenize(plaintext or ""):
+        terms[term] = terms.get(term, 0) | CONTENT_FIELD
+    return terms
+
+
+def search_fields(search_in: Iterable[str]) -> int:
+    """Convert a search request's search_in list to a NoteTerm.fields mask."""
+    fields = 0
+    if "title" in search_in:
+        fields |= TITLE_FIELD
+    if "content" in search_in:
+        fields |= CONTENT_FIELD
+    return fields
+
+
+def _chunks(items: List, size: int = 500) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _term_ids(db: Session, terms: List[str]) -> Dict[str, int]:
+    """Look up vocabulary ids, adding any terms that are new."""
+    ids: Dict[str, int] = {}
+    for chunk in _chunks(terms):
+        ids.update(db.execute(
+            select(models.SearchTerm.term, models.SearchTerm.id)
+            .where(models.SearchTerm.term.in_(chunk))
+        ).all())
+    
+    missing = [term for term in terms if term not in ids]
+    if missing:
+        # OR IGNORE: another process may add the same term concurrently
+        db.execute(
+            insert(models.SearchTerm).prefix_with("OR IGNORE"),
+            [{"term": term, "trigram_count": len(trigrams(term))} for term in missing]
+        )
+        new_ids: Dict[str, int] = {}
+        for chunk in _chunks(missing):
+            new_ids.update(db.execute(
+                select(models.SearchTerm.term, models.SearchTerm.id)
+                .where(models.SearchTerm.term.in_(chunk))
+            ).all())
+        db.execute(
+            insert(models.TermTrigram).prefix_with("OR IGNORE"),
+            [
+                {"trigram": trigram, "term_id": term_id}
+                for term, term_id in new_ids.items()
+                for trigram in trigrams(term)
+            ]
+        )
+        ids.update(new_ids)
+    return ids
+
+
+def _posted_term_ids(db: Session, note_ids) -> Set[int]:
+    return set(db.execute(
+        select(models.NoteTerm.term_id).where(models.NoteTerm.note_id.in_(note_ids)).distinct()
+    ).scalars())
+
+
+def prune_terms(db: Session, term_ids: Optional[Iterable[int]] = None) -> int:
+    """Delete vocabulary terms (and their trigrams) that no note uses any more.
+    
+    Only the given terms are checked, or the whole vocabulary if None.
+    The caller commits.
+    
+    Returns:
+        Number of terms deleted
+    """
+    unused = select(models.SearchTerm.id, models.SearchTerm.term).where(
+        ~exists().where(models.NoteTerm.term_id == models.SearchTerm.id)
+    )
+    if term_ids is None:
+        rows = db.execute(unused).all()
+    else:
+        rows = []
+        for chunk in _chunks(list(term_ids)):
+            rows += db.execute(unused.where(models.SearchTerm.id.in_(chunk))).all()
+    if not rows:
+        return 0
+    
+    # Delete trigram rows by primary key rather than scanning for the term
+    # id; a Core executemany, as the ORM has no bulk DELETE with a WHERE
+    term_trigrams = models.TermTrigram.__table__
+    db.connection().execute(
+        delete(term_trigrams).where(
+            term_trigrams.c.trigram == bindparam("trigram_value"),
+            term_trigrams.c.term_id == bindparam("term_id_value")
+        ),
+        [
+            {"trigram_value": trigram, "term_id_value": term_id}
+            for term_id, term in rows
+            for trigram in trigrams(term)
+        ]
+    )
+    for chunk in _chunks([term_id for term_id, _ in rows]):
+        db.execute(delete(models.SearchTerm).where(models.SearchTerm.id.in_(chunk)))
+    return len(rows)
+
+
+def index_note(db: Session, note_id: int, title: Optional[str], plaintext: Optional[str]):
+    """(Re)index a note's title and plaintext. The caller commits."""
+    previous = _posted_term_ids(db, [note_id])
+    db.execute(delete(models.NoteTerm).where(models.NoteTerm.note_id == note_id))
+    terms = _note_terms(title, plaintext)
+    term_ids = _term_ids(db, sorted(terms)) if terms else {}
+    if term_ids:
+        db.execute(
+            insert(models.NoteTerm),
+            [
+                {"note_id": note_id, "term_id": term_id, "fields": terms[term]}
+                for term, term_id in term_ids.items()
+            ]
+        )
+    # Words from earlier versions (e.g. half-typed ones saved by autosave)
+    # must not linger in the vocabulary
+    prune_terms(db, previous - set(term_ids.values()))
+
+
+def remove_note(db: Session, note_id: int):
+    """Drop a note's postings from the index. The caller commits."""
+    remove_notes(db, [note_id])
+
+
+def remove_notes(db: Session, note_ids):
+    """Drop the postings of many notes (a list or subquery of ids). The caller commits."""
+    previous = _posted_term_ids(db, note_ids)
+    db.execute(delete(models.NoteTerm).where(models.NoteTerm.note_id.in_(note_ids)))
+    prune_terms(db, previous)
+
+
+def rebuild_index(db: Session, batch_size: int = 2000) -> int:
+    """Rebuild the whole fuzzy search index from stored notes.
+    
+    Builds the vocabulary in memory and inserts rows in bulk, which is much
+    faster than indexing notes one at a time.
+    
+    Returns:
+        Number of notes indexed
+    """
+    db.execute(delete(models.NoteTerm))
+    db.execute(delete(models.TermTrigram))
+    db.execute(delete(models.SearchTerm))
+    connection = db.connection()
+    
+    # Loading postings without the term index and building it once at the
+    # end is much faster than maintaining it row by row
+    term_index = next(iter(models.NoteTerm.__table__.indexes))
+    term_index.drop(connection, checkfirst=True)
+    
+    vocabulary: Dict[str, int] = {}
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(models.Note.id, models.Note.title, models.Note.plaintext)
+            .where(models.Note.id > last_id)
+            .order_by(models.Note.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        
+        new_terms = []
+        postings = []
+        for note_id, title, plaintext in rows:
+            for term, fields in _note_terms(title, plaintext).items():
+                term_id = vocabulary.get(term)
+                if term_id is None:
+                    term_id = vocabulary[term] = len(vocabulary) + 1
+                    new_terms.append((term_id, term, len(trigrams(term))))
+                postings.append((note_id, term_id, fields))
+        
+        # Plain DBAPI executemany: millions of rows are too slow through the ORM
+        if new_terms:
+            connection.exec_driver_sql(
+                "INSERT INTO search_terms (id, term, trigram_count) VALUES (?, ?, ?)",
+                new_terms
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO term_trigrams (trigram, term_id) VALUES (?, ?)",
+                [(trigram, term_id) for term_id, term, _ in new_terms for trigram in trigrams(term)]
+            )
+        if postings:
+            connection.exec_driver_sql(
+                "INSERT INTO note_terms (note_id, term_id, fields) VALUES (?, ?, ?)",
+                postings
+            )
+        
+        indexed += len(rows)
+        last_id = rows[-1][0]
+    
+    term_index.create(connection)
+    db.commit()
+    return indexed
+
+
+def similar_terms(db: Session, word: str) -> List[Tuple[int, float]]:
+    """Return (term_id, similarity) for vocabulary terms similar to word."""
+    word_trigrams = trigrams(word)
+    query_count = len(word_trigrams)
+    shared = func.count().label("shared")
+    rows = db.execute(
+        select(models.TermTrigram.term_id, shared, models.SearchTerm.trigram_count)
+        .join(models.SearchTerm, models.SearchTerm.id == models.TermTrigram.term_id)
+        .where(models.TermTrigram.trigram.in_(word_trigrams))
+        # Only terms some note still uses can match
+        .where(exists().where(models.NoteTerm.term_id == models.SearchTerm.id))
+        # Terms far shorter or longer than the word can never reach the threshold
+        .where(models.SearchTerm.trigram_count.between(
+            int(query_count * SIMILARITY_THRESHOLD),
+            int(query_count / SIMILARITY_THRESHOLD) + 1
+        ))
+        .group_by(models.TermTrigram.term_id)
+    ).all()
+    
+    matches = []
+    for term_id, shared_count, term_count in rows:
+        similarity = shared_count / (query_count + term_count - shared_count)
+        if similarity >= SIMILARITY_THRESHOLD:
+            matches.append((term_id, similarity))
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches[:MAX_TERMS_PER_WORD]
+
+
+def fuzzy_scores(db: Session, keyword: str, fields: int = ALL_FIELDS):
+    """Build a subquery of (note_id, score) for notes fuzzily matching keyword.
+    
+    Every query word must match some term in the note, in one of the given
+    fields (a TITLE_FIELD/CONTENT_FIELD mask); a note's score is the sum over
+    query words of its best term similarity. Returns None when some word has
+    no similar term at all (so nothing can match).
+    """
+    words = sorted(tokenize(keyword))[:MAX_QUERY_WORDS]
+    if not words:
+        return None
+    
+    per_word_selects = []
+    for word in words:
+        matches = similar_terms(db, word)
+        if not matches:
+            return None
+        similarity = case(dict(matches), value=models.NoteTerm.term_id)
+        per_word = (
+            select(
+                models.NoteTerm.note_id.label("note_id"),
+                func.max(similarity).label("best")
+            )
+            .where(models.NoteTerm.term_id.in_([term_id for term_id, _ in matches]))
+            .group_by(models.NoteTerm.note_id)
+        )
+        if fields != ALL_FIELDS:
+            per_word = per_word.where(models.NoteTerm.fields.op("&")(fields) != 0)
+        per_word_selects.append(per_word)
+    
+    per_word = union_all(*per_word_selects).subquery()
+    return (
+        select(per_word.c.note_id, func.sum(per_word.c.best).label("score"))
+        .group_by(per_word.c.note_id)
+        .having(func.count() == len(words))
+        .subquery()
+    )
@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils import extract_upload_references
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_DIR = os.path.join("static", "uploads")
+
+# What the upload endpoint accepts and how it names files; nothing else in
+# the uploads directory (.gitkeep, exports, files put there by hand) is
+# ever collected
+UPLOAD_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+UPLOAD_PREFIX = "image_"
+
+# Unreferenced uploads are kept this long, so images in unsaved drafts and
+# references removed by an undo survive
+GRACE_PERIOD = timedelta(hours=24)
+
+# Orphan candidates examined per collection pass
+BATCH_SIZE = 500
+
+
+def is_collectable(filename: str) -> bool:
+    """Whether filename is one the upload endpoint could have created."""
+    return (
+        filename.startswith(UPLOAD_PREFIX)
+        and os.path.basename(filename) == filename
+        and os.path.splitext(filename)[1].lower() in UPLOAD_EXTENSIONS
+    )
+
+
+def _mark_candidates(db: Session, filenames: Iterable[str]):
+    """Queue files for a GC check one grace period from now. The caller commits."""
+    now = datetime.utcnow()
+    rows = [{"filename": filename, "since": now} for filename in filenames if is_collectable(filename)]
+    if rows:
+        # OR REPLACE restarts the grace period of an existing candidate
+        db.execute(insert(models.OrphanCandidate).prefix_with("OR REPLACE"), rows)
+
+
+def register_upload(db: Session, filename: str):
+    """Track a new upload; it is collected if no note uses it within the grace period."""
+    _mark_candidates(db, [filename])
+    db.commit()
+
+
+def set_note_images(db: Session, note_id: int, html_content: Optional[str]):
+    """Update a note's image references from its HTML. The caller commits.
+    
+    Images the note no longer uses become orphan candidates.
+    """
+    current = extract_upload_references(html_content)
+    previous = set(db.execute(
+        select(models.NoteImage.filename).where(models.NoteImage.note_id == note_id)
+    ).scalars())
+    
+    removed = previous - current
+    if removed:
+        db.execute(
+            delete(models.NoteImage)
+            .where(models.NoteImage.note_id == note_id)
+            .where(models.NoteImage.filename.in_(removed))
+        )
+        _mark_candidates(db, removed)
+    added = current - previous
+    if added:
+        db.execute(
+            insert(models.NoteImage),
+            [{"note_id": note_id, "filename": filename} for filename in added]
+        )
+
+
+def remove_notes(db: Session, note_ids):
+    """Drop the image references of notes (a list or subquery of ids). The caller commits."""
+    db.execute(
+        insert(models.OrphanCandidate).prefix_with("OR REPLACE").from_select(
+            ["filename", "since"],
+            select(models.NoteImage.filename, literal(datetime.utcnow()))
+            .where(models.NoteImage.note_id.in_(note_ids))
+            .distinct()
+        )
+    )
+    db.execute(delete(models.NoteImage).where(models.NoteImage.note_id.in_(note_ids)))
+
+
+def rebuild_references(db: Session, batch_size: int = 2000) -> int:
+    """Rebuild the image reference index from all note HTML.
+    
+    Every upload in the uploads directory that no note refers to becomes an
+    orphan candidate, so it is only deleted after a full grace period.
+    
+    Returns:
+        Number of references found
+    """
+    db.execute(delete(models.NoteImage))
+    referenced = set()
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(models.Note.id, models.Note.html_content)
+            .where(models.Note.id > last_id)
+            .order_by(models.Note.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        references = [
+            {"note_id": note_id, "filename": filename}
+            for note_id, html_content in rows
+            for filename in extract_upload_references(html_content)
+        ]
+        if references:
+            db.execute(insert(models.NoteImage), references)
+        referenced.update(reference["filename"] for reference in references)
+        last_id = rows[-1][0]
+    
+    if os.path.isdir(UPLOADS_DIR):
+        with os.scandir(UPLOADS_DIR) as entries:
+            _mark_candidates(db, [
+                entry.name for entry in entries
+                if entry.is_file() and entry.name not in referenced
+            ])
+    db.commit()
+    return len(referenced)
+
+
+def collect_orphans(
+    db: Session,
+    grace_period: timedelta = GRACE_PERIOD,
+    batch_size: int = BATCH_SIZE
+) -> Tuple[int, int]:
+    """Check up to batch_size candidates past the grace period, deleting unreferenced files.
+    
+    Only the candidate queue and the reference index are read, never note
+    HTML or the whole uploads directory.
+    
+    Returns:
+        (candidates examined, files deleted)
+    """
+    cutoff = datetime.utcnow() - grace_period
+    filenames = list(db.execute(
+        select(models.OrphanCandidate.filename)
+        .where(models.OrphanCandidate.since <= cutoff)
+        .order_by(models.OrphanCandidate.since)
+        .limit(batch_size)
+    ).scalars())
+    if not filenames:
+        return 0, 0
+    
+    # Dequeue first: the write lock this takes keeps notes from gaining a
+    # reference to these files until the reference check below commits
+    db.execute(delete(models.OrphanCandidate).where(models.OrphanCandidate.filename.in_(filenames)))
+    referenced = set(db.execute(
+        select(models.NoteImage.filename).where(models.NoteImage.filename.in_(filenames))
+    ).scalars())
+    
+    deleted = 0
+    for filename in filenames:
+        # Names come from parsed HTML; only touch files the upload endpoint
+        # named, and never follow one out of the uploads directory
+        if filename in referenced or not is_collectable(filename):
+            continue
+        path = os.path.join(UPLOADS_DIR, filename)
+        if not os.path.isfile(path):
+            continue
+        try:
+            os.remove(path)
+            deleted += 1
+        except OSError:
+            # Logged and dropped, so one bad entry cannot stall every later pass
+            logger.exception("Failed to delete orphaned upload %s", path)
+    db.commit()
+    return len(filenames), deleted
+
+
+class UploadGarbageCollector:
+    """
+    Background thread that deletes orphaned uploads every interval seconds,
+    a batch at a time.
+    """
+    
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        interval: float,
+        grace_period: timedelta = GRACE_PERIOD
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.grace_period = grace_period
+        self.deleted_count = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start the background GC thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="upload-gc", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the GC thread (the current batch finishes first)."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+    
+    def collect(self) -> int:
+        """Run batches until the due candidates are exhausted; return files deleted."""
+        total = 0
+        db = self.session_factory()
+        try:
+            while not self._stop_event.is_set():
+                examined, deleted = collect_orphans(db, self.grace_period)
+                total += deleted
+                if examined < BATCH_SIZE:
+                    break
+        finally:
+            db.close()
+        self.deleted_count += total
+        return total
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                deleted = self.collect()
+                if deleted:
+                    logger.info("Deleted %d orphaned uploads", deleted)
+            except Exception:
+                logger.exception("Upload garbage collection failed")
@@ -1,6 +1,16 @@
-from bs4 import BeautifulSoup
-import html2text
-import markdown
+import hashlib
+import re
+from html.parser import HTMLParser
+from typing import List, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+# BeautifulSoup, html2text and markdown (which pulls in Pygments via
+# codehilite) are imported inside the functions that use them so that
+# importing this module stays cheap for processes that only serve reads.
+
+# Paths of <img> src values pointing into static/uploads, as absolute
+# paths, full URLs or editor-relative paths
+_UPLOAD_PATH_RE = re.compile(r"(?:^|/)static/uploads/([^/]+)$", re.IGNORECASE)
 
 
 def extract_plaintext(html_content: str) -> str:
@@ -13,6 +23,8 @@ def extract_plaintext(html_content: str) -> str:
     Returns:
         Cleaned plaintext string
     """
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_content, 'html.parser')
     plaintext = soup.get_text(separator=' ', strip=True)
     return plaintext
@@ -28,6 +40,8 @@ def html_to_markdown(html_content: str) -> str:
     Returns:
         Markdown formatted string
     """
+    import html2text
+
     h = html2text.HTML2Text()
     h.ignore_links = False
     h.body_width = 0  # No text wrapping
@@ -45,8 +59,96 @@ def markdown_to_html(markdown_content: str) -> str:
     Returns:
         HTML formatted string
     """
+    import markdown
+
     html = markdown.markdown(
         markdown_content,
         extensions=['extra', 'codehilite', 'tables', 'fenced_code']
     )
     return html
+
+
+def content_hash(html_content: str) -> str:
+    """
+    Compute the version hash of a note's HTML content.
+    
+    Args:
+        html_content: HTML string to hash
+        
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    return hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+
+
+def apply_text_edits(base: str, edits: List[Tuple[int, int, str]]) -> str:
+    """
+    Apply splice edits to a base string.
+    
+    Each edit replaces base[start:end] with text. Offsets are Unicode code
+    point positions in the base string; edits must not overlap.
+    
+    Args:
+        base: String the edits were computed against
+        edits: List of (start, end, text) tuples
+        
+    Returns:
+        The edited string
+        
+    Raises:
+        ValueError: If an edit is out of range or edits overlap
+    """
+    parts = []
+    position = 0
+    for start, end, text in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+        if start < position or end < start or end > len(base):
+            raise ValueError(f"Invalid edit range [{start}, {end})")
+        parts.append(base[position:start])
+        parts.append(text)
+        position = end
+    parts.append(base[position:])
+    return "".join(parts)
+
+
+class _ImageSourceParser(HTMLParser):
+    """Collects the src attribute of every <img> tag."""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.sources: List[str] = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == "img":
+            self.sources.extend(value for name, value in attrs if name == "src" and value)
+
+
+def extract_upload_references(html_content: str) -> Set[str]:
+    """
+    Find the uploaded images a note's HTML refers to.
+    
+    The HTML is parsed rather than pattern-matched, so quoted, unquoted and
+    entity-encoded src values are all found.
+    
+    Args:
+        html_content: HTML string to scan
+        
+    Returns:
+        Set of file names in static/uploads used by <img> tags
+    """
+    # Most notes have no uploads; skip parsing those
+    if not html_content or "uploads" not in html_content.lower():
+        return set()
+    
+    parser = _ImageSourceParser()
+    parser.feed(html_content)
+    parser.close()
+    filenames = set()
+    for source in parser.sources:
+        match = _UPLOAD_PATH_RE.search(urlsplit(source.strip()).path)
+        if match:
+            filenames.add(unquote(match.group(1)))
+    # Decoded names such as "%2e%2e" or "a%2Fb" must not escape the directory
+    return {
+        filename for filename in filenames
+        if filename not in ("", ".", "..") and "/" not in filename and "\\" not in filename
+    }
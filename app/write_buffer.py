@@ -0,0 +1,222 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.utils import content_hash, extract_plaintext, html_to_markdown, apply_text_edits
+
+logger = logging.getLogger(__name__)
+
+
+class NoteWriteBuffer:
+    """
+    Write-behind buffer for note updates.
+    
+    Repeated updates to the same note are collapsed into the latest version
+    and flushed periodically, with all pending notes written in a single
+    transaction. The buffer is per process: reads that must see buffered
+    writes go through overlay().
+    """
+    
+    def __init__(self, session_factory: Callable[[], Session], flush_interval: float = 0.5):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.flush_count = 0
+        self.written_count = 0
+        self._pending: Dict[int, dict] = {}
+        # Batch currently being written; still visible to reads until committed
+        self._inflight: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+        # Serializes flushes so a failed batch is re-queued before the next one
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start the background flush thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="note-write-buffer", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the flush thread and write everything still pending."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+    
+    def submit(self, note_id: int, fields: dict, base_hash: Optional[str] = None):
+        """Queue field updates (html_content, area, tags) for a note.
+        
+        If base_hash is given, the update is only queued while the note's
+        current content hash (buffered or stored) still matches it.
+        """
+        fields = dict(fields)
+        if "html_content" in fields:
+            fields["content_hash"] = content_hash(fields["html_content"])
+        fields["modified_at"] = datetime.utcnow()
+        with self._lock:
+            if base_hash is not None:
+                current = self._inflight.get(note_id, {}).get("content_hash")
+                current = self._pending.get(note_id, {}).get("content_hash", current)
+                if current is not None and current != base_hash:
+                    raise crud.VersionConflictError("Note was modified since the base version")
+            pending = self._pending.setdefault(note_id, {})
+            if "html_content" in fields and "plaintext" not in fields:
+                # Derived fields of older buffered content would be stale
+                pending.pop("plaintext", None)
+                pending.pop("markdown_content", None)
+            pending.update(fields)
+    
+    def update(
+        self,
+        db: Session,
+        note_id: int,
+        note_update: schemas.NoteUpdate
+    ) -> Optional[models.Note]:
+        """Buffered counterpart of crud.update_note.
+        
+        Submissions identical to the note's buffered or stored state are not
+        queued. Content is converted once here and the derived fields are
+        kept with the pending update, so the flush does not convert again.
+        """
+        db_note = crud.get_note(db, note_id)
+        if not db_note:
+            return None
+        
+        fields = note_update.model_dump(exclude_unset=True)
+        if "tags" in fields and fields["tags"] is None:
+            fields["tags"] = []
+        changes = crud._note_changes(
+            self.overlay(db_note, derive=False),
+            fields.get("html_content"),
+            fields.get("area"),
+            fields.get("tags"),
+            area_set="area" in fields
+        )
+        if not changes:
+            return self.overlay(db_note)
+        
+        if "html_content" in changes:
+            changes["plaintext"] = extract_plaintext(changes["html_content"])
+            changes["markdown_content"] = html_to_markdown(changes["html_content"])
+        self.submit(note_id, changes)
+        return self.overlay(db_note)
+    
+    def patch(
+        self,
+        db: Session,
+        note_id: int,
+        note_patch: schemas.NotePatch
+    ) -> Optional[models.Note]:
+        """Buffered counterpart of crud.patch_note, checked against buffered content."""
+        db_note = crud.get_note(db, note_id)
+        if not db_note:
+            return None
+        
+        current = self.overlay(db_note, derive=False)
+        if current.content_hash != note_patch.base_hash:
+            raise crud.VersionConflictError("Note was modified since the base version")
+        
+        fields = {}
+        if note_patch.edits:
+            fields["html_content"] = apply_text_edits(
+                current.html_content,
+                [(edit.start, edit.end, edit.text) for edit in note_patch.edits]
+            )
+        if "area" in note_patch.model_fields_set:
+            fields["area"] = note_patch.area
+        if note_patch.tags is not None:
+            fields["tags"] = note_patch.tags
+        if fields:
+            self.submit(note_id, fields, base_hash=note_patch.base_hash)
+        return self.overlay(db_note, derive=False)
+    
+    def get_pending(self, note_id: int) -> Optional[dict]:
+        """Return a copy of the buffered fields for a note, if any."""
+        with self._lock:
+            if note_id not in self._pending and note_id not in self._inflight:
+                return None
+            fields = dict(self._inflight.get(note_id, {}))
+            fields.update(self._pending.get(note_id, {}))
+            return fields
+    
+    def discard(self, note_id: int):
+        """Drop buffered updates for a note (e.g. because it was deleted)."""
+        with self._lock:
+            self._pending.pop(note_id, None)
+            self._inflight.pop(note_id, None)
+    
+    def overlay(self, db_note: models.Note, derive: bool = True) -> models.Note:
+        """Return the note as it will be after buffered updates are flushed.
+        
+        With derive=False the plaintext and markdown fields are left stale
+        unless already derived on submit, for callers that only need the
+        HTML, hash and metadata.
+        """
+        fields = self.get_pending(db_note.id)
+        if not fields:
+            return db_note
+        
+        # Build a detached copy so the session never sees (or flushes) it
+        note = models.Note(**{
+            column.name: getattr(db_note, column.name)
+            for column in models.Note.__table__.columns
+        })
+        for field, value in fields.items():
+            setattr(note, field, value)
+        if derive and "html_content" in fields and "plaintext" not in fields:
+            note.plaintext = extract_plaintext(note.html_content)
+            note.markdown_content = html_to_markdown(note.html_content)
+        return note
+    
+    def flush(self) -> int:
+        """Write all pending updates in one transaction; return notes written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return 0
+            
+            updates = {
+                note_id: {
+                    k: v for k, v in fields.items()
+                    if k not in ("content_hash", "modified_at")
+                }
+                for note_id, fields in batch.items()
+            }
+            db = self.session_factory()
+            try:
+                written = crud.apply_note_updates(db, updates)
+            except Exception:
+                db.rollback()
+                # Re-queue the batch underneath anything submitted meanwhile
+                with self._lock:
+                    for note_id, fields in self._inflight.items():
+                        merged = dict(fields)
+                        merged.update(self._pending.get(note_id, {}))
+                        self._pending[note_id] = merged
+                    self._inflight = {}
+                raise
+            finally:
+                db.close()
+            
+            with self._lock:
+                self._inflight = {}
+            self.flush_count += 1
+            self.written_count += written
+            return written
+    
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered note writes")
@@ -0,0 +1,337 @@
+"""
+NoteCraft performance benchmarks.
+
+Runs against a throwaway database in a temporary directory, so it never
+touches your notes.db. Usage:
+
+    python benchmark.py [corpus_size]
+
+corpus_size is the number of synthetic notes for the search benchmarks
+(default 100000).
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def timed(func, *args, **kwargs):
+    """Run func and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def report(label: str, seconds: float, extra: str = ""):
+    """Print one benchmark result line."""
+    line = f"  {label:<44} {seconds * 1000:10.2f} ms"
+    if extra:
+        line += f"  ({extra})"
+    print(line)
+
+
+def cold_import_time(module: str, runs: int = 5) -> float:
+    """Best-of-N wall time to import a module in a fresh interpreter."""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", f"import {module}"],
+            cwd=PROJECT_ROOT,
+            check=True,
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_startup():
+    """Import time of the app modules and init_db on fresh/current databases."""
+    print("Startup")
+    report("bare interpreter", cold_import_time("sys"))
+    for module in ("app.utils", "app.crud", "main"):
+        report(f"import {module}", cold_import_time(module))
+    
+    from app.database import init_db
+    
+    _, fresh = timed(init_db)
+    report("init_db (fresh database)", fresh)
+    _, current = timed(init_db)
+    report("init_db (current schema)", current)
+
+
+def bench_autosave_writes(notes: int = 20, updates: int = 400):
+    """Sustained note update throughput, direct vs. write-behind buffer."""
+    from app import crud, schemas
+    from app.database import SessionLocal
+    from app.write_buffer import NoteWriteBuffer
+    
+    print(f"Autosave writes ({updates} updates across {notes} notes)")
+    db = SessionLocal()
+    note_ids = [
+        crud.create_note(db, schemas.NoteCreate(html_content=f"<p>Note {i}</p>")).id
+        for i in range(notes)
+    ]
+    
+    def run(update_note):
+        for i in range(updates):
+            note_id = note_ids[i % notes]
+            html = f"<h1>Draft {note_id}</h1><p>{'lorem ipsum ' * 200}</p><p>rev {i}</p>"
+            update_note(note_id, schemas.NoteUpdate(html_content=html))
+    
+    _, direct = timed(run, lambda note_id, update: crud.update_note(db, note_id, update))
+    report("direct update_note", direct, f"{updates / direct:.0f} writes/s, {updates} transactions")
+    
+    buffer = NoteWriteBuffer(SessionLocal, flush_interval=0.05)
+    buffer.start()
+    
+    def buffered():
+        run(lambda note_id, update: buffer.update(db, note_id, update))
+        buffer.stop()
+    
+    _, elapsed = timed(buffered)
+    report(
+        "write-behind buffer (50 ms window)", elapsed,
+        f"{updates / elapsed:.0f} writes/s, {buffer.flush_count} transactions, "
+        f"{buffer.written_count} rows written"
+    )
+    db.close()
+
+
+def build_corpus(size: int):
+    """Bulk-insert a synthetic corpus of notes (bypassing HTML conversion)."""
+    import random
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from app import models
+    from app.database import SessionLocal, migrate_note_tags
+    
+    rng = random.Random(42)
+    syllables = ["ku", "ber", "net", "es", "py", "thon", "ra", "dis", "po", "stg",
+                 "re", "sql", "ite", "do", "cker", "ja", "va", "scr", "ipt", "go"]
+    vocabulary = sorted({
+        "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        for _ in range(20000)
+    }) + ["kubernetes", "python", "javascript", "postgres", "docker"]
+    areas = ["Learning", "Blog Ideas", "Code Snippets", "Personal"]
+    tags = ["AI", "Python", "Architect", "Javascript", "Web3", "Idea", "Tutorial"]
+    start = datetime(2024, 1, 1)
+    
+    db = SessionLocal()
+    batch = []
+    for i in range(size):
+        plaintext = " ".join(rng.choice(vocabulary) for _ in range(40))
+        created = start + timedelta(minutes=i)
+        batch.append({
+            "title": created.strftime("%Y-%m-%d_%H-%M"),
+            "html_content": f"<p>{plaintext}</p>",
+            "plaintext": plaintext,
+            "markdown_content": plaintext,
+            "area": rng.choice(areas),
+            "tags": rng.sample(tags, rng.randint(0, 3)),
+            "created_at": created,
+            "modified_at": created,
+        })
+        if len(batch) == 5000:
+            db.execute(insert(models.Note), batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.Note), batch)
+    migrate_note_tags(db)
+    db.commit()
+    db.close()
+
+
+def bench_fuzzy_search(corpus_size: int):
+    """Trigram index rebuild, fuzzy vs. substring search, facet and cache latency."""
+    from app import crud, schemas, search_index
+    from app.database import SessionLocal
+    
+    print(f"Fuzzy search ({corpus_size} notes)")
+    db = SessionLocal()
+    indexed, elapsed = timed(search_index.rebuild_index, db)
+    report("rebuild trigram index", elapsed, f"{indexed / elapsed:.0f} notes/s")
+    
+    cases = [
+        ("kubernetes", False, False),
+        ("kubernetes", False, True),
+        ("kubernets", True, False),
+        ("pythn dokcer", True, False),
+    ]
+    for keyword, fuzzy, facets in cases:
+        request = schemas.SearchRequest(keyword=keyword, fuzzy=fuzzy, facets=facets)
+        response, elapsed = timed(crud.search_notes, db, request)
+        label = f"{'fuzzy' if fuzzy else 'substring'} search '{keyword}'"
+        if facets:
+            label += " + facets"
+        report(label, elapsed, f"{response.total} results")
+    
+    request = schemas.SearchRequest(keyword="kubernetes", facets=True)
+    response, elapsed = timed(crud.search_notes, db, request)
+    report("repeated search (result cache hit)", elapsed, f"{response.total} results")
+    db.close()
+
+
+def bench_related_notes(corpus_size: int):
+    """TF-IDF related-notes index build, incremental update and query latency."""
+    from app import crud, related_index, schemas
+    from app.database import SessionLocal
+    
+    print(f"Related notes ({corpus_size} notes)")
+    db = SessionLocal()
+    indexed, elapsed = timed(related_index.rebuild, db)
+    report("rebuild TF-IDF index", elapsed, f"{indexed / elapsed:.0f} notes/s")
+    
+    note = crud.get_note(db, corpus_size // 2)
+    _, elapsed = timed(crud.get_related_notes, db, note.id)
+    report("first query (loads index, IDF, norms)", elapsed)
+    related, elapsed = timed(crud.get_related_notes, db, note.id)
+    report("top-10 related notes", elapsed, f"best score {related[0].score:.3f}" if related else "")
+    
+    _, elapsed = timed(
+        crud.update_note, db, note.id,
+        schemas.NoteUpdate(html_content=f"<p>{note.plaintext} kubernetes</p>")
+    )
+    report("update_note incl. incremental index update", elapsed)
+    _, elapsed = timed(crud.get_related_notes, db, note.id)
+    report("query after update (reloads generation)", elapsed)
+    db.close()
+
+
+def bench_bulk_operations(corpus_size: int):
+    """Set-based bulk tag, area and delete operations over a search filter."""
+    from app import crud, schemas
+    from app.database import SessionLocal
+    
+    print(f"Bulk operations ({corpus_size} notes)")
+    db = SessionLocal()
+    learning = schemas.SearchRequest(area="Learning")
+    cases = [
+        ("add tag to area 'Learning'", crud.bulk_update_notes,
+         schemas.BulkNoteUpdate(filter=learning, add_tags=["Review"])),
+        ("add same tag again (no-op)", crud.bulk_update_notes,
+         schemas.BulkNoteUpdate(filter=learning, add_tags=["Review"])),
+        ("move area 'Learning' to 'Personal'", crud.bulk_update_notes,
+         schemas.BulkNoteUpdate(filter=learning, area="Personal")),
+        ("delete notes matching 'kubernetes'", crud.bulk_delete_notes,
+         schemas.BulkNoteSelection(filter=schemas.SearchRequest(keyword="kubernetes"))),
+    ]
+    for label, operation, request in cases:
+        response, elapsed = timed(operation, db, request)
+        report(label, elapsed, f"{response.matched} matched, {response.affected} affected")
+    db.close()
+
+
+def bench_tag_operations(corpus_size: int):
+    """Corpus-wide tag rename and merge, and tag statistics."""
+    from app import crud, models, schemas
+    from app.database import SessionLocal
+    
+    print(f"Tag operations ({corpus_size} notes)")
+    db = SessionLocal()
+    tag_ids = dict(db.query(models.Tag.name, models.Tag.id).all())
+    
+    _, elapsed = timed(crud.update_tag, db, tag_ids["Javascript"], schemas.TagUpdate(name="JavaScript"))
+    report("rename 'Javascript' -> 'JavaScript'", elapsed)
+    result, elapsed = timed(crud.merge_tag, db, tag_ids["Web3"], schemas.TagMerge(into="Idea"))
+    report("merge 'Web3' into 'Idea'", elapsed, f"{result.notes_updated} notes updated")
+    stats, elapsed = timed(crud.get_statistics, db)
+    report("statistics (tag counts from note_tags)", elapsed, f"{stats.notes_by_tag.get('Idea', 0)} 'Idea' notes")
+    db.close()
+
+
+def bench_backup(uploads: int = 200, upload_size: int = 100_000):
+    """Online snapshot duration/throughput, incremental uploads and writer latency."""
+    import threading
+    from app import backup, crud, schemas
+    from app.database import SessionLocal
+    
+    os.makedirs(backup.UPLOADS_DIR, exist_ok=True)
+    for i in range(uploads):
+        with open(os.path.join(backup.UPLOADS_DIR, f"image_{i}.png"), "wb") as f:
+            f.write(os.urandom(upload_size))
+    
+    print(f"Backup ({uploads} uploads of {upload_size // 1000} KB)")
+    for label in ("first snapshot", "incremental snapshot"):
+        result, elapsed = timed(backup.create_snapshot)
+        report(
+            label, elapsed,
+            f"{result.database_bytes / 1e6:.0f} MB database, {result.uploads_copied} uploads copied, "
+            f"{result.throughput_mb_per_second:.0f} MB/s"
+        )
+    
+    # Writers keep going while a snapshot runs
+    db = SessionLocal()
+    note_id = crud.create_note(db, schemas.NoteCreate(html_content="<p>draft</p>")).id
+    thread = threading.Thread(target=backup.create_snapshot)
+    thread.start()
+    latencies = []
+    while thread.is_alive():
+        update = schemas.NoteUpdate(html_content=f"<p>draft {len(latencies)}</p>")
+        latencies.append(timed(crud.update_note, db, note_id, update)[1])
+    thread.join()
+    report(
+        "update_note during snapshot (max)", max(latencies),
+        f"{len(latencies)} writes, median {sorted(latencies)[len(latencies) // 2] * 1000:.1f} ms"
+    )
+    db.close()
+
+
+def bench_upload_gc(corpus_size: int, uploads: int = 2000):
+    """Image reference index rebuild and an incremental orphan collection pass."""
+    from datetime import timedelta
+    from app import crud, schemas, upload_gc
+    from app.database import SessionLocal
+    
+    print(f"Upload GC ({corpus_size} notes, {uploads} uploads)")
+    db = SessionLocal()
+    os.makedirs(upload_gc.UPLOADS_DIR, exist_ok=True)
+    for i in range(uploads):
+        filename = f"image_gc_{i}.png"
+        with open(os.path.join(upload_gc.UPLOADS_DIR, filename), "wb") as f:
+            f.write(b"\x89PNG")
+        upload_gc.register_upload(db, filename)
+    # Half of the uploads end up in a note
+    for i in range(0, uploads, 100):
+        images = "".join(f'<img src="/static/uploads/image_gc_{j}.png">' for j in range(i, i + 50))
+        crud.create_note(db, schemas.NoteCreate(html_content=f"<p>gallery</p>{images}"))
+    
+    referenced, elapsed = timed(upload_gc.rebuild_references, db)
+    report("rebuild reference index (all note HTML)", elapsed, f"{referenced} referenced files")
+    
+    def collect_all():
+        deleted = 0
+        while True:
+            examined, batch_deleted = upload_gc.collect_orphans(db, timedelta(0))
+            deleted += batch_deleted
+            if examined < upload_gc.BATCH_SIZE:
+                return deleted
+    
+    deleted, elapsed = timed(collect_all)
+    report("collect orphans (candidate queue only)", elapsed, f"{deleted} files deleted")
+    db.close()
+
+
+def main():
+    corpus_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sys.path.insert(0, PROJECT_ROOT)
+    with tempfile.TemporaryDirectory() as workdir:
+        # The database URL is relative, so this keeps notes.db out of the repo
+        os.chdir(workdir)
+        bench_startup()
+        bench_autosave_writes()
+        _, elapsed = timed(build_corpus, corpus_size)
+        print(f"Synthetic corpus ({corpus_size} notes)")
+        report("build corpus", elapsed)
+        bench_fuzzy_search(corpus_size)
+        bench_related_notes(corpus_size)
+        bench_bulk_operations(corpus_size)
+        bench_tag_operations(corpus_size)
+        bench_backup()
+        bench_upload_gc(corpus_size)
+
+
+if __name__ == "__main__":
+    main()
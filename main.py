@@ -5,12 +5,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.background import BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 import uvicorn
 import os
 import shutil
-from app.database import get_db, init_db
-from app import crud, schemas
+from app.database import get_db, init_db, SessionLocal
+from app import crud, schemas, related_index
+from app.write_buffer import NoteWriteBuffer
+from app.backup import BackupScheduler, create_snapshot, list_snapshots
+from app.upload_gc import UploadGarbageCollector, register_upload, UPLOAD_EXTENSIONS, UPLOAD_PREFIX
+from app.search_cache import search_cache
 from app.utils import html_to_markdown
 
 
@@ -27,11 +31,63 @@ app.add_middleware(
 )
 
 
+# Optional write-behind buffer for note updates: flush interval in seconds,
+# unset or 0 to write every update immediately. The buffer is per process,
+# so only enable it when running a single worker.
+WRITE_BUFFER_INTERVAL = float(os.environ.get("NOTECRAFT_WRITE_BUFFER_INTERVAL", "0"))
+write_buffer = NoteWriteBuffer(SessionLocal, WRITE_BUFFER_INTERVAL) if WRITE_BUFFER_INTERVAL > 0 else None
+
+# Optional scheduled backups: interval in hours (unset or 0 for on-demand
+# only) and how many snapshot archives to keep
+BACKUP_INTERVAL_HOURS = float(os.environ.get("NOTECRAFT_BACKUP_INTERVAL_HOURS", "0"))
+BACKUP_KEEP = int(os.environ.get("NOTECRAFT_BACKUP_KEEP", "7"))
+backup_scheduler = (
+    BackupScheduler(BACKUP_INTERVAL_HOURS * 3600, BACKUP_KEEP) if BACKUP_INTERVAL_HOURS > 0 else None
+)
+
+# Deletes uploaded images no note refers to: how often to check, in
+# seconds (0 disables), and how long an unreferenced file is kept
+UPLOAD_GC_INTERVAL = float(os.environ.get("NOTECRAFT_UPLOAD_GC_INTERVAL", "3600"))
+UPLOAD_GC_GRACE_HOURS = float(os.environ.get("NOTECRAFT_UPLOAD_GC_GRACE_HOURS", "24"))
+upload_collector = (
+    UploadGarbageCollector(SessionLocal, UPLOAD_GC_INTERVAL, timedelta(hours=UPLOAD_GC_GRACE_HOURS))
+    if UPLOAD_GC_INTERVAL > 0 else None
+)
+
+# Compacts the related-notes index off the request path
+index_compactor = related_index.IndexCompactor()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and create necessary directories on startup."""
     init_db()
     os.makedirs("static/uploads", exist_ok=True)
+    # Build the related-notes index here rather than on the first request
+    db = SessionLocal()
+    try:
+        related_index.ensure_built(db)
+    finally:
+        db.close()
+    index_compactor.start()
+    if write_buffer:
+        write_buffer.start()
+    if backup_scheduler:
+        backup_scheduler.start()
+    if upload_collector:
+        upload_collector.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush buffered note writes and stop background tasks before exit."""
+    if write_buffer:
+        write_buffer.stop()
+    if backup_scheduler:
+        backup_scheduler.stop()
+    if upload_collector:
+        upload_collector.stop()
+    index_compactor.stop()
 
 
 # Mount static files - ensure directory exists before mounting
@@ -84,6 +140,8 @@ def get_note(note_id: int, db: Session = Depends(get_db)):
     note = crud.get_note(db, note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    if write_buffer:
+        note = write_buffer.overlay(note)
     return note
 
 
@@ -94,7 +152,31 @@ def update_note(
     db: Session = Depends(get_db)
 ):
     """Update an existing note."""
-    note = crud.update_note(db, note_id, note_update)
+    if write_buffer:
+        note = write_buffer.update(db, note_id, note_update)
+    else:
+        note = crud.update_note(db, note_id, note_update)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return note
+
+
+@app.patch("/api/notes/{note_id}", response_model=schemas.NotePatchResponse)
+def patch_note(
+    note_id: int,
+    note_patch: schemas.NotePatch,
+    db: Session = Depends(get_db)
+):
+    """Apply a text diff to a note's content (delta autosave)."""
+    try:
+        if write_buffer:
+            note = write_buffer.patch(db, note_id, note_patch)
+        else:
+            note = crud.patch_note(db, note_id, note_patch)
+    except crud.VersionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     return note
@@ -103,12 +185,56 @@ def update_note(
 @app.delete("/api/notes/{note_id}", status_code=204)
 def delete_note(note_id: int, db: Session = Depends(get_db)):
     """Delete a note by ID."""
+    if write_buffer:
+        write_buffer.discard(note_id)
     success = crud.delete_note(db, note_id)
     if not success:
         raise HTTPException(status_code=404, detail="Note not found")
     return None
 
 
+@app.post("/api/notes/bulk-update", response_model=schemas.BulkOperationResponse)
+def bulk_update_notes(
+    bulk_update: schemas.BulkNoteUpdate,
+    db: Session = Depends(get_db)
+):
+    """Change the area and/or tags of notes selected by ids or a search filter."""
+    # Write buffered updates first so they cannot overwrite the bulk change
+    if write_buffer:
+        write_buffer.flush()
+    try:
+        return crud.bulk_update_notes(db, bulk_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/notes/bulk-delete", response_model=schemas.BulkOperationResponse)
+def bulk_delete_notes(
+    selection: schemas.BulkNoteSelection,
+    db: Session = Depends(get_db)
+):
+    """Delete notes selected by ids or a search filter."""
+    if write_buffer:
+        write_buffer.flush()
+    try:
+        return crud.bulk_delete_notes(db, selection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/notes/{note_id}/related", response_model=schemas.RelatedNotesResponse)
+def get_related_notes(
+    note_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Get notes similar to a note (TF-IDF cosine similarity)."""
+    related = crud.get_related_notes(db, note_id, limit)
+    if related is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return {"related": related}
+
+
 # Search Endpoint
 
 @app.post("/api/search", response_model=schemas.SearchResponse)
@@ -117,8 +243,13 @@ def search_notes(
     db: Session = Depends(get_db)
 ):
     """Search notes with keyword and filters."""
-    results = crud.search_notes(db, search_request)
-    return {"results": results, "total": len(results)}
+    return crud.search_notes(db, search_request)
+
+
+@app.get("/api/search/cache", response_model=schemas.SearchCacheStats)
+def get_search_cache_stats():
+    """Get this worker's search result cache counters."""
+    return search_cache.stats()
 
 
 # Calendar Endpoint
@@ -174,6 +305,43 @@ def create_tag(tag: schemas.TagCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.put("/api/tags/{tag_id}", response_model=schemas.TagResponse)
+def update_tag(
+    tag_id: int,
+    tag_update: schemas.TagUpdate,
+    db: Session = Depends(get_db)
+):
+    """Rename and/or recolor a tag; renames are applied to every note."""
+    # Write buffered updates first so they cannot bring back the old name
+    if write_buffer:
+        write_buffer.flush()
+    try:
+        tag = crud.update_tag(db, tag_id, tag_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not tag:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    return tag
+
+
+@app.post("/api/tags/{tag_id}/merge", response_model=schemas.TagMergeResponse)
+def merge_tag(
+    tag_id: int,
+    tag_merge: schemas.TagMerge,
+    db: Session = Depends(get_db)
+):
+    """Merge a tag into another tag across all notes and delete it."""
+    if write_buffer:
+        write_buffer.flush()
+    try:
+        result = crud.merge_tag(db, tag_id, tag_merge)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    return result
+
+
 @app.get("/api/settings", response_model=List[schemas.SettingResponse])
 def get_settings(db: Session = Depends(get_db)):
     """Get all settings."""
@@ -206,6 +374,8 @@ def export_note(
     note = crud.get_note(db, note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    if write_buffer:
+        note = write_buffer.overlay(note)
     
     # Determine content and media type based on format
     if format == "markdown":
@@ -239,10 +409,10 @@ def export_note(
 # Image Upload Endpoint
 
 @app.post("/api/upload-image")
-async def upload_image(file: UploadFile = File(...)):
+def upload_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """Upload an image file for use in notes."""
     # Validate file extension
-    allowed_extensions = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+    allowed_extensions = UPLOAD_EXTENSIONS
     file_extension = os.path.splitext(file.filename)[1].lower()
     
     if file_extension not in allowed_extensions:
@@ -253,7 +423,7 @@ async def upload_image(file: UploadFile = File(...)):
     
     # Generate unique filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_filename = f"image_{timestamp}{file_extension}"
+    unique_filename = f"{UPLOAD_PREFIX}{timestamp}{file_extension}"
     
     # Save file to static/uploads
     os.makedirs("static/uploads", exist_ok=True)
@@ -262,10 +432,30 @@ async def upload_image(file: UploadFile = File(...)):
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
     
+    # Collected later unless a saved note refers to it
+    register_upload(db, unique_filename)
+    
     # Return location for TinyMCE
     return {"location": f"/static/uploads/{unique_filename}"}
 
 
+# Backup Endpoints
+
+@app.post("/api/backup", response_model=schemas.BackupResponse)
+def create_backup():
+    """Create a snapshot archive of the database and uploads (online, non-blocking)."""
+    # Include buffered writes in the snapshot
+    if write_buffer:
+        write_buffer.flush()
+    return create_snapshot()
+
+
+@app.get("/api/backup", response_model=List[str])
+def get_backups():
+    """List snapshot archives, oldest first."""
+    return list_snapshots()
+
+
 # Main entry point
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=5000, reload=True)
@@ -10,7 +10,10 @@ const appState = {
   tags: [],
   selectedArea: null,
   selectedTags: [],
-  allNotes: []
+  allNotes: [],
+  // Server copy of the open note's HTML and its hash (base for delta saves)
+  savedHtml: null,
+  contentHash: null
 };
 
 // ============================================
@@ -325,6 +328,8 @@ function createNewNote() {
   
   // Reset current note ID
   appState.currentNoteId = null;
+  appState.savedHtml = null;
+  appState.contentHash = null;
   
   // Update title display
   const titleDisplay = document.getElementById('note-title-display');
@@ -375,29 +380,41 @@ async function saveNote() {
       tags: selectedTags
     };
     
-    let response;
-    if (appState.currentNoteId) {
-      // Update existing note
-      response = await fetch(`/api/notes/${appState.currentNoteId}`, {
-        method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(noteData)
-      });
-    } else {
-      // Create new note
-      response = await fetch('/api/notes', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(noteData)
-      });
+    let savedNote = null;
+    if (appState.currentNoteId && appState.contentHash) {
+      // Send only the changed span; null means the user chose to overwrite
+      // a conflicting version with a full save
+      savedNote = await patchNote(content.html, area || null, selectedTags);
     }
     
-    if (!response.ok) {
-      const error = await response.json();
-      throw new Error(error.detail || 'Failed to save note');
+    if (!savedNote) {
+      let response;
+      if (appState.currentNoteId) {
+        // Update existing note
+        response = await fetch(`/api/notes/${appState.currentNoteId}`, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify(noteData)
+        });
+      } else {
+        // Create new note
+        response = await fetch('/api/notes', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify(noteData)
+        });
+      }
+      
+      if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Failed to save note');
+      }
+      
+      savedNote = await response.json();
+      appState.savedHtml = savedNote.html_content;
+      appState.contentHash = savedNote.content_hash;
     }
     
-    const savedNote = await response.json();
     appState.currentNoteId = savedNote.id;
     
     // Update title display
@@ -432,6 +449,93 @@ async function saveNote() {
   }
 }
 
+/**
+ * Count Unicode code points (the server's offset unit) in a string
+ */
+function codePointLength(text) {
+  const pairs = text.match(/[\uD800-\uDBFF][\uDC00-\uDFFF]/g);
+  return text.length - (pairs ? pairs.length : 0);
+}
+
+/**
+ * Compute a single splice edit turning oldText into newText
+ * @returns {Object|null} - { start, end, text } in code points, or null if equal
+ */
+function computeTextEdit(oldText, newText) {
+  if (oldText === newText) return null;
+  
+  const maxPrefix = Math.min(oldText.length, newText.length);
+  let prefix = 0;
+  while (prefix < maxPrefix && oldText.charCodeAt(prefix) === newText.charCodeAt(prefix)) {
+    prefix++;
+  }
+  // Never split a surrogate pair
+  if (prefix > 0 && /[\uD800-\uDBFF]/.test(oldText[prefix - 1])) {
+    prefix--;
+  }
+  
+  const maxSuffix = maxPrefix - prefix;
+  let suffix = 0;
+  while (suffix < maxSuffix &&
+         oldText.charCodeAt(oldText.length - 1 - suffix) === newText.charCodeAt(newText.length - 1 - suffix)) {
+    suffix++;
+  }
+  if (suffix > 0 && /[\uDC00-\uDFFF]/.test(oldText[oldText.length - suffix])) {
+    suffix--;
+  }
+  
+  const start = codePointLength(oldText.substring(0, prefix));
+  return {
+    start: start,
+    end: start + codePointLength(oldText.substring(prefix, oldText.length - suffix)),
+    text: newText.substring(prefix, newText.length - suffix)
+  };
+}
+
+/**
+ * Save the open note by sending a diff against the last saved version
+ * @returns {Object|null} - Saved note summary, or null if the user chose to
+ *   overwrite a version saved elsewhere (the caller then does a full save)
+ */
+async function patchNote(html, area, tags) {
+  const edit = computeTextEdit(appState.savedHtml, html);
+  
+  const response = await fetch(`/api/notes/${appState.currentNoteId}`, {
+    method: 'PATCH',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      base_hash: appState.contentHash,
+      edits: edit ? [edit] : [],
+      area: area,
+      tags: tags
+    })
+  });
+  
+  if (response.status === 409) {
+    // Note changed elsewhere; never overwrite that change without asking
+    const overwrite = confirm(
+      'This note was changed elsewhere since you opened it.\n\n' +
+      'OK: overwrite those changes with your version\n' +
+      'Cancel: discard your edits and load the saved version'
+    );
+    if (overwrite) {
+      return null;
+    }
+    await loadNote(appState.currentNoteId);
+    throw new Error('Note was changed elsewhere; loaded the saved version');
+  }
+  
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Failed to save note');
+  }
+  
+  const savedNote = await response.json();
+  appState.savedHtml = html;
+  appState.contentHash = savedNote.content_hash;
+  return savedNote;
+}
+
 async function loadNote(noteId) {
   try {
     const response = await fetch(`/api/notes/${noteId}`);
@@ -444,6 +548,8 @@ async function loadNote(noteId) {
     
     const note = await response.json();
     appState.currentNoteId = note.id;
+    appState.savedHtml = note.html_content;
+    appState.contentHash = note.content_hash;
     
     // Update title display
     const titleDisplay = document.getElementById('note-title-display');
@@ -76,7 +76,8 @@ async function performSearch() {
       keyword: keyword,
       area: appState.selectedArea || null,
       tags: appState.selectedTags || [],
-      search_in: ['title', 'content']
+      search_in: ['title', 'content'],
+      facets: true
     };
     
     // Perform search
@@ -93,7 +94,7 @@ async function performSearch() {
     const results = await response.json();
     
     // Render results
-    renderSearchResults(results.results || [], keyword);
+    renderSearchResults(results.results || [], keyword, results.facets);
     
     // Switch to notes view
     if (window.appUtils) {
@@ -126,7 +127,7 @@ async function performSearch() {
 // ============================================
 // Render Search Results
 // ============================================
-function renderSearchResults(results, keyword) {
+function renderSearchResults(results, keyword, facets = null) {
   const container = document.getElementById('notes-list');
   if (!container) return;
   
@@ -158,8 +159,8 @@ function renderSearchResults(results, keyword) {
     // Highlight keyword in title
     const highlightedTitle = highlightKeyword(note.title, keyword);
     
-    // Create snippet with keyword context
-    const snippet = createSearchSnippet(note.html_content, keyword);
+    // Snippet is server-built HTML: escaped text with matches in <mark>
+    const snippet = note.snippet || '';
     
     return `
       <div class="note-list-item search-result" data-note-id="${note.id}" onclick="window.appUtils.loadNote(${note.id})">
@@ -183,11 +184,31 @@ function renderSearchResults(results, keyword) {
     <div class="search-info-text">
       Found ${results.length} result${results.length !== 1 ? 's' : ''} for "${escapeHtml(keyword)}"
     </div>
+    ${renderFacets(facets)}
     <button class="btn btn-secondary btn-sm" onclick="window.searchUtils.clearSearch()">Clear Search</button>
   `;
   container.insertBefore(searchInfo, container.firstChild);
 }
 
+// ============================================
+// Render Facet Counts
+// ============================================
+function renderFacets(facets) {
+  if (!facets) return '';
+  
+  const entries = [
+    ...Object.entries(facets.areas || {}),
+    ...Object.entries(facets.tags || {}).map(([name, count]) => ['#' + name, count])
+  ];
+  if (entries.length === 0) return '';
+  
+  const items = entries
+    .sort((a, b) => b[1] - a[1])
+    .map(([name, count]) => `<span class="search-facet">${escapeHtml(name)} (${count})</span>`)
+    .join(' ');
+  return `<div class="search-facets">${items}</div>`;
+}
+
 // ============================================
 // Highlight Keyword
 // ============================================
@@ -202,41 +223,6 @@ function highlightKeyword(text, keyword) {
   return escapedText.replace(regex, '<mark>$1</mark>');
 }
 
-// ============================================
-// Create Search Snippet
-// ============================================
-function createSearchSnippet(htmlContent, keyword, maxLength = 200) {
-  if (!htmlContent) return '';
-  
-  // Extract plain text from HTML
-  const tempDiv = document.createElement('div');
-  tempDiv.innerHTML = htmlContent;
-  const text = tempDiv.textContent || tempDiv.innerText || '';
-  
-  // Find keyword position
-  const keywordPos = text.toLowerCase().indexOf(keyword.toLowerCase());
-  
-  if (keywordPos === -1) {
-    // Keyword not found, return beginning of text
-    const snippet = text.substring(0, maxLength);
-    return escapeHtml(snippet) + (text.length > maxLength ? '...' : '');
-  }
-  
-  // Calculate context window around keyword
-  const contextStart = Math.max(0, keywordPos - Math.floor(maxLength / 2));
-  const contextEnd = Math.min(text.length, contextStart + maxLength);
-  
-  // Extract snippet
-  let snippet = text.substring(contextStart, contextEnd);
-  
-  // Add ellipsis
-  if (contextStart > 0) snippet = '...' + snippet;
-  if (contextEnd < text.length) snippet = snippet + '...';
-  
-  // Highlight keyword in snippet
-  return highlightKeyword(snippet, keyword);
-}
-
 // ============================================
 // Clear Search
 // ============================================